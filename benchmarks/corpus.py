@@ -0,0 +1,99 @@
+"""Seeded generator of synthetic Python sources for benchmarking.
+
+The generated modules are syntactically valid and only define things at
+the top level, so they are also safe to pass to ``execute_code``.
+"""
+
+import random
+from typing import List
+
+# Statements that trigger one of the analyzers' rules. ``{v}`` is replaced by
+# a fresh variable name.
+FINDINGS = [
+    "print({v})",
+    "{v}_token = 'hardcoded'",
+    "result = eval('{v}')",
+    "if {v} is None:\n    {v} = 0",
+    "try:\n    {v} = int({v})\nexcept:\n    {v} = 0",
+    "helper_0()",
+]
+
+CLEAN = [
+    "{v} = {v} + 1",
+    "{v} = [item * 2 for item in range(10)]",
+    "{v} = len(str({v}))",
+    "total = sum(range({v})) if {v} else 0",
+    "{v} = min({v}, 10)",
+]
+
+
+def _indent(text: str, level: int) -> List[str]:
+    return ["    " * level + line for line in text.split("\n")]
+
+
+class _Generator:
+    def __init__(self, seed: int, depth: int, density: float):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.density = density
+        self.counter = 0
+
+    def name(self) -> str:
+        self.counter += 1
+        return f"value_{self.counter}"
+
+    def statement(self, level: int) -> List[str]:
+        templates = FINDINGS if self.random.random() < self.density else CLEAN
+        return _indent(self.random.choice(templates).format(v=self.name()), level)
+
+    def block(self, level: int, remaining_depth: int, budget: int) -> List[str]:
+        lines: List[str] = []
+        while len(lines) < budget:
+            if remaining_depth > 0 and self.random.random() < 0.3:
+                keyword = self.random.choice(["if {v}:", "for {v} in range(3):", "while {v} < 0:"])
+                lines.extend(_indent(keyword.format(v=self.name()), level))
+                lines.extend(self.block(level + 1, remaining_depth - 1, max(1, budget // 3)))
+            else:
+                lines.extend(self.statement(level))
+        return lines
+
+    def function(self, index: int, level: int, budget: int) -> List[str]:
+        lines = _indent(f"def helper_{index}(a, b, c=None):", level)
+        lines.extend(_indent('"""Generated helper."""', level + 1))
+        lines.extend(self.block(level + 1, self.depth, budget))
+        lines.extend(_indent("return a", level + 1))
+        return lines
+
+    def klass(self, index: int, budget: int) -> List[str]:
+        lines = [f"class Generated{index}:", '    """Generated class."""']
+        for method in range(3):
+            lines.extend(_indent(f"def method_{method}(self, x):", 1))
+            lines.extend(self.block(2, self.depth, max(1, budget // 3)))
+            lines.extend(_indent("return x", 2))
+        return lines
+
+
+def generate(lines: int, depth: int = 3, density: float = 0.05, seed: int = 0) -> str:
+    """Generates a Python module of roughly ``lines`` lines.
+
+    Args:
+        lines: Approximate number of lines to generate
+        depth: Maximum nesting depth of if/for/while blocks
+        density: Probability that a statement triggers an analyzer rule
+        seed: Random seed; the same arguments always give the same source
+
+    Returns:
+        The generated source code
+    """
+    generator = _Generator(seed, depth, density)
+    output = ['"""Generated benchmark module."""', ""]
+    index = 0
+    while len(output) < lines:
+        budget = generator.random.randint(5, 40)
+        if generator.random.random() < 0.2:
+            output.extend(generator.klass(index, budget))
+        else:
+            output.extend(generator.function(index, 0, budget))
+        output.append("")
+        index += 1
+    return "\n".join(output) + "\n"
@@ -0,0 +1,211 @@
+"""Benchmarks for the analyzers, fix suggester and executor.
+
+Usage:
+    python -m benchmarks.run --sizes 1000 5000 20000 --output results.json
+    python -m benchmarks.run --compare baseline.json
+
+Each benchmark reports throughput in lines per second, p50/p99 latency and
+the peak memory allocated during one call (measured with tracemalloc in a
+separate, untimed run). Analysis caches are cleared before every call so
+the numbers describe a cold analysis.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import generate
+from bug_finder import engine
+
+DEFAULT_SIZES = [1000, 5000, 20000]
+DEFAULT_ITERATIONS = 10
+DEFAULT_THRESHOLD = 0.10
+
+
+def _benchmarks() -> Dict[str, Callable[[str], Callable[[], Any]]]:
+    """Maps benchmark names to factories that prepare a call for a source."""
+    from bug_finder.agent import analyze_code, execute_code, suggest_fixes
+    from bug_finder.agents.code_analyzer import analyze_structure
+    from bug_finder.agents.fix_suggester import CodeFix, apply_fix, apply_fixes, verify_fixes
+    from bug_finder.agents.security_analyzer import analyze_security
+
+    def prepare_suggest_fixes(code: str) -> Callable[[], Any]:
+        bugs = analyze_code(code)["bugs_found"]
+        return lambda: suggest_fixes(code, bugs)
+
+    def prepare_apply_fix(code: str) -> Callable[[], Any]:
+        middle = code.count('\n') // 2 or 1
+        fix = CodeFix(
+            issue_type="style",
+            line=middle,
+            original_code="",
+            suggested_fix="pass",
+            explanation="Benchmark fix"
+        )
+        return lambda: apply_fix(code, fix)
+
+    def batch_fixes(code: str) -> List[CodeFix]:
+        # A fix every 100 lines, as in an auto-fix run over a large file
+        return [
+            CodeFix(
+                issue_type="style",
+                line=line,
+                original_code="",
+                suggested_fix="pass",
+                explanation="Benchmark fix"
+            )
+            for line in range(1, code.count('\n') + 1, 100)
+        ]
+
+    def prepare_apply_fixes(code: str) -> Callable[[], Any]:
+        fixes = batch_fixes(code)
+        return lambda: apply_fixes(code, fixes)
+
+    def prepare_verify_fixes(code: str) -> Callable[[], Any]:
+        fixes = batch_fixes(code)
+        return lambda: verify_fixes(code, fixes)
+
+    return {
+        "analyze_code": lambda code: lambda: analyze_code(code),
+        "analyze_structure": lambda code: lambda: analyze_structure(code),
+        "analyze_security": lambda code: lambda: analyze_security(code),
+        "suggest_fixes": prepare_suggest_fixes,
+        "apply_fix": prepare_apply_fix,
+        "apply_fixes": prepare_apply_fixes,
+        "verify_fixes": prepare_verify_fixes,
+        "execute_code": lambda code: lambda: execute_code(code),
+    }
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def measure(call: Callable[[], Any], lines: int, iterations: int) -> Dict[str, float]:
+    """Times ``call`` and measures its peak allocation."""
+    timings = []
+    for _ in range(iterations):
+        engine.cache.clear()
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    engine.cache.clear()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        "lines": lines,
+        "iterations": iterations,
+        "lines_per_sec": lines * iterations / total if total else 0.0,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "peak_kib": peak / 1024
+    }
+
+
+def run(
+    sizes: List[int],
+    iterations: int = DEFAULT_ITERATIONS,
+    depth: int = 3,
+    density: float = 0.05,
+    seed: int = 0,
+    only: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Runs the benchmarks and returns a JSON-compatible result document."""
+    benchmarks = _benchmarks()
+    results: Dict[str, Dict[str, float]] = {}
+    for size in sizes:
+        code = generate(size, depth=depth, density=density, seed=seed)
+        lines = code.count('\n')
+        for name, prepare in benchmarks.items():
+            if only and name not in only:
+                continue
+            results[f"{name}@{size}"] = measure(prepare(code), lines, iterations)
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "ruleset_version": engine.RULESET_VERSION,
+            "sizes": sizes,
+            "iterations": iterations,
+            "depth": depth,
+            "density": density,
+            "seed": seed
+        },
+        "results": results
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD
+) -> List[Tuple[str, str, float, float]]:
+    """Finds benchmarks that got slower or hungrier than the baseline.
+
+    Returns:
+        List of (benchmark, metric, baseline value, current value)
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_kib"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, metric, previous[metric], result[metric]))
+        if result["lines_per_sec"] < previous["lines_per_sec"] * (1 - threshold):
+            regressions.append((name, "lines_per_sec", previous["lines_per_sec"], result["lines_per_sec"]))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Source sizes in lines")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--depth", type=int, default=3, help="Maximum nesting depth")
+    parser.add_argument("--density", type=float, default=0.05,
+                        help="Fraction of statements that trigger a rule")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", default=None, help="Run only these benchmarks")
+    parser.add_argument("--output", "-o", default=None, help="Write results JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.iterations, args.depth, args.density, args.seed, args.only)
+    document = json.dumps(current, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before:.2f} -> {after:.2f}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Command line interface for the bug finder."""
+
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+from bug_finder import scan, symbols
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="bug_finder",
+        description="Find bugs in Python code"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser(
+        "scan",
+        help="Scan every .py file below a path and print JSON Lines results"
+    )
+    scan_parser.add_argument("path", help="Directory or file to scan")
+    scan_parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes (default: CPU count)"
+    )
+    scan_parser.add_argument(
+        "--chunksize", type=int, default=scan.DEFAULT_CHUNKSIZE,
+        help="Number of files handed to a worker at a time"
+    )
+    scan_parser.add_argument(
+        "--output", "-o", default=None,
+        help="Write results to this file instead of stdout"
+    )
+    scan_parser.add_argument(
+        "--index", default=None,
+        help="Symbol index to check cross-module calls against (see the index command)"
+    )
+
+    index_parser = subparsers.add_parser(
+        "index",
+        help="Build or update the symbol index of a project"
+    )
+    index_parser.add_argument("path", help="Project root directory")
+    index_parser.add_argument(
+        "--db", default=None,
+        help=f"Index database (default: <path>/{symbols.DEFAULT_DB_NAME})"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output:
+                return scan.run_scan(args.path, output, args.workers, args.chunksize, args.index)
+        return scan.run_scan(args.path, sys.stdout, args.workers, args.chunksize, args.index)
+
+    if args.command == "index":
+        db_path = args.db or os.path.join(args.path, symbols.DEFAULT_DB_NAME)
+        index = symbols.SymbolIndex(db_path)
+        try:
+            stats = index.update(args.path)
+        finally:
+            index.close()
+        print(json.dumps({"database": db_path, **stats}))
+        return 0
+
+    parser.error(f"Unknown command: {args.command}")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
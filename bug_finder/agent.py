@@ -2,10 +2,7 @@
 
 import os
 import sys
-from io import StringIO
-from contextlib import redirect_stdout, redirect_stderr
-from typing import Dict, Any, List
-import ast
+from typing import Dict, Any, List, Optional
 import inspect
 
 from google.adk.agents import Agent
@@ -13,6 +10,12 @@ from google.adk.tools import FunctionTool
 from google.genai.types import Tool, ToolCodeExecution, GenerateContentConfig
 from pydantic import BaseModel, Field
 
+from bug_finder import aio, engine, execution, fix_templates, sandbox, symbols
+from bug_finder.fast_path import FastPath
+
+# Model behind the root agent
+MODEL = os.getenv("BUG_FINDER_MODEL", "gemini-2.0-flash")
+
 # Define models for our function parameters
 class Bug(BaseModel):
     type: str = Field(description="Type of the bug (e.g., 'syntax', 'logical', 'runtime')")
@@ -20,13 +23,6 @@ class Bug(BaseModel):
     description: str = Field(description="Description of the bug")
     severity: str = Field(description="Severity level of the bug", default="medium")
 
-class ExecutionResult(BaseModel):
-    stdout: str = Field(description="Standard output from execution")
-    stderr: str = Field(description="Standard error output")
-    error: str = Field(description="Any error messages", default="")
-    execution_time: float = Field(description="Time taken to execute in seconds")
-    runtime_issues: list = Field(description="Any runtime issues detected", default_factory=list)
-
 def analyze_code(code: str) -> Dict[str, Any]:
     """Analyzes Python code for potential bugs.
     
@@ -36,94 +32,14 @@ def analyze_code(code: str) -> Dict[str, Any]:
     Returns:
         Dict containing analysis results with potential bugs found.
     """
-    bugs = []
-    
-    try:
-        tree = ast.parse(code)
-        
-        # Track function definitions and their parameters
-        function_defs = {}
-        
-        # First pass: collect function definitions
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                args = []
-                defaults = len(node.args.defaults)
-                for i, arg in enumerate(node.args.args):
-                    has_default = i >= len(node.args.args) - defaults
-                    args.append({
-                        'name': arg.arg,
-                        'has_default': has_default
-                    })
-                function_defs[node.name] = args
-        
-        # Second pass: analyze for issues
-        for node in ast.walk(tree):
-            # Check function calls against definitions
-            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                func_name = node.func.id
-                if func_name in function_defs:
-                    required_args = [arg for arg in function_defs[func_name] if not arg['has_default']]
-                    if len(node.args) < len(required_args):
-                        bugs.append({
-                            "type": "logical",
-                            "line": node.lineno,
-                            "description": f"Missing required argument(s) in call to {func_name}(). Expected {len(required_args)} arguments, got {len(node.args)}.",
-                            "severity": "high"
-                        })
-            
-            # Check for bare except clauses
-            elif isinstance(node, ast.Try):
-                for handler in node.handlers:
-                    if handler.type is None:
-                        bugs.append({
-                            "type": "logical",
-                            "line": handler.lineno,
-                            "description": "Bare except clause found. This catches all exceptions which is not recommended.",
-                            "severity": "medium"
-                        })
-            
-            # Check for print function calls
-            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                if node.func.id == 'print':
-                    bugs.append({
-                        "type": "style",
-                        "line": node.lineno,
-                        "description": "Print function found. Consider using logging for production code.",
-                        "severity": "low"
-                    })
-            
-            # Check for dangerous eval/exec calls
-            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                if node.func.id in ['eval', 'exec']:
-                    bugs.append({
-                        "type": "security",
-                        "line": node.lineno,
-                        "description": f"Dangerous use of {node.func.id}(). This can execute arbitrary code.",
-                        "severity": "high"
-                    })
-            
-            # Check for hardcoded secrets
-            elif isinstance(node, ast.Assign):
-                for target in node.targets:
-                    if isinstance(target, ast.Name):
-                        name = target.id.lower()
-                        if any(secret in name for secret in ['password', 'secret', 'key', 'token']):
-                            if isinstance(node.value, ast.Constant):
-                                bugs.append({
-                                    "type": "security",
-                                    "line": node.lineno,
-                                    "description": "Hardcoded secret detected. Use environment variables instead.",
-                                    "severity": "high"
-                                })
-
-    except SyntaxError as e:
-        bugs.append({
-            "type": "syntax",
-            "line": e.lineno or 0,
-            "description": str(e),
-            "severity": "high"
-        })
+    report = engine.analyze(code)
+    index = symbols.default_index()
+    if index is not None:
+        report = index.check(report)
+    if report.syntax_error:
+        bugs = [engine.syntax_issue(report)]
+    else:
+        bugs = engine.render(report, "code")
     
     return {
         "status": "success",
@@ -139,143 +55,122 @@ def suggest_fixes(
     
     Args:
         code: The original Python code.
-        bugs: List of bug dictionaries, each containing type, line number, description, and severity.
+        bugs: List of bug dictionaries, each containing rule, type, line number, description, and severity.
         
     Returns:
         Dict containing suggested fixes for each bug.
     """
     fixes = []
     
-    for bug in bugs:
-        bug_type = bug.get('type', '')
-        line_num = bug.get('line', 0)
-        description = bug.get('description', '')
-        
-        if bug_type == "syntax":
-            fixes.append(f"Line {line_num}: Fix the syntax error - {description}")
-        elif bug_type == "logical":
-            if "bare except" in description.lower():
-                fixes.append(f"Line {line_num}: Specify the exceptions you want to catch, e.g., 'except ValueError:'")
-        elif bug_type == "security":
-            if "hardcoded secret" in description.lower():
-                fixes.append(f"Line {line_num}: Use environment variables:\nimport os\nsecret = os.getenv('SECRET_KEY')")
-            elif "eval" in description.lower():
-                fixes.append(f"Line {line_num}: Avoid using eval(). Consider using ast.literal_eval() for safe parsing or implement proper input validation.")
-        elif bug_type == "style":
-            if "print" in description.lower():
-                fixes.append(f"Line {line_num}: Replace print with logging:\nimport logging\nlogging.info('your message')")
+    # Fixes are looked up by the rule ID of each bug, see bug_finder/fix_templates.py
+    for suggestion in fix_templates.suggest(code, bugs):
+        if suggestion.suggested_fix is None:
+            fixes.append(f"Line {suggestion.line}: {suggestion.explanation}")
+        else:
+            fixes.append(f"Line {suggestion.line}: {suggestion.explanation}:\n{suggestion.suggested_fix}")
     
     return {
         "status": "success",
         "fixes": fixes
     }
 
-def execute_code(code: str, timeout_seconds: int = 5) -> Dict[str, Any]:
+def execute_code(
+    code: str,
+    timeout_seconds: int = 5,
+    profile: bool = False,
+    monitor: bool = False
+) -> Dict[str, Any]:
     """Executes Python code in a safe environment.
     
+    The code runs in a sandbox worker process under CPU-time, memory and
+    output-size limits, and is killed if it exceeds ``timeout_seconds``.
+    
     Args:
         code: The code to execute.
         timeout_seconds: Maximum execution time allowed.
+        profile: Whether to profile the run and report its slowest lines,
+            slowest functions and biggest allocation sites as performance
+            issues.
+        monitor: Whether to record line coverage, exceptions swallowed by
+            except clauses and loops over the iteration budget, and report
+            them as runtime issues.
         
     Returns:
         Dict containing execution results.
     """
-    import time
-    start_time = time.time()
-    
-    # Create string buffers for output capture
-    stdout_buffer = StringIO()
-    stderr_buffer = StringIO()
+    limits = sandbox.Limits()
+    result = sandbox.execute(code, timeout_seconds, limits, profile, monitor)
+    flagged = {finding.line: finding.rule for finding in engine.analyze(code).findings} if monitor else {}
+    return execution.execution_result(result, limits, flagged)
+
+def execute_many(
+    snippets: List[str],
+    timeout_seconds: int = 5,
+    max_parallel: int = 4,
+    deadline_seconds: float = 60
+) -> Dict[str, Any]:
+    """Executes several Python snippets in parallel sandbox workers.
     
-    try:
-        # Compile the code first to catch syntax errors
-        compiled_code = compile(code, '<string>', 'exec')
-        
-        # Create a restricted globals dictionary with safe builtins
-        safe_builtins = {
-            'print': print,
-            'len': len,
-            'str': str,
-            'int': int,
-            'float': float,
-            'bool': bool,
-            'list': list,
-            'dict': dict,
-            'set': set,
-            'tuple': tuple,
-            'range': range,
-            'enumerate': enumerate,
-            'zip': zip,
-            'min': min,
-            'max': max,
-            'sum': sum,
-            'abs': abs,
-            'round': round,
-            'True': True,
-            'False': False,
-            'None': None,
-        }
-        
-        restricted_globals = {
-            '__builtins__': safe_builtins,
-            '__name__': '__main__',
-            '__doc__': None,
-            '__package__': None,
-        }
-        
-        # Execute with output capture
-        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-            exec(compiled_code, restricted_globals)
-        
-        execution_time = time.time() - start_time
+    Args:
+        snippets: The code snippets to execute.
+        timeout_seconds: Maximum execution time allowed per snippet.
+        max_parallel: Maximum number of snippets running at the same time.
+        deadline_seconds: Time allowed for the whole batch; snippets not
+            started by then are skipped.
         
-        return {
-            "status": "success",
-            "result": ExecutionResult(
-                stdout=stdout_buffer.getvalue(),
-                stderr=stderr_buffer.getvalue(),
-                error="",
-                execution_time=execution_time,
-                runtime_issues=[]
-            ).dict()
-        }
+    Returns:
+        Dict containing the execution results, in the order of the snippets.
+    """
+    limits = sandbox.Limits()
+    results = sandbox.execute_many(snippets, timeout_seconds, max_parallel, deadline_seconds, limits)
+    return execution.batch_result(results, limits)
+
+# Async versions of the tools, which run in thread pools so that a slow
+# tool call does not block the server's event loop
+analyze_code_async = aio.analysis_tool(analyze_code)
+suggest_fixes_async = aio.analysis_tool(suggest_fixes)
+execute_code_async = aio.sandbox_tool(execute_code)
+execute_many_async = aio.sandbox_tool(execute_many)
+
+# Plain code submissions are answered by running the tools up front, see
+# bug_finder/fast_path.py
+fast_path = FastPath(analyze_code, suggest_fixes, execute_code)
+
+def create_root_agent(model: Any = MODEL) -> Agent:
+    """Creates the root agent.
+    
+    Args:
+        model: Model name, or a ``BaseLlm`` such as a local stub model.
         
-    except Exception as e:
-        execution_time = time.time() - start_time
-        return {
-            "status": "error",
-            "result": ExecutionResult(
-                stdout=stdout_buffer.getvalue(),
-                stderr=stderr_buffer.getvalue(),
-                error=f"{type(e).__name__}: {str(e)}",
-                execution_time=execution_time,
-                runtime_issues=[{
-                    "type": "execution_error",
-                    "description": str(e),
-                    "severity": "high"
-                }]
-            ).dict()
-        }
+    Returns:
+        The agent, with its tools and the fast path callbacks.
+    """
+    return Agent(
+        name="bug_finder",
+        model=model,
+        description="An agent that analyzes Python code for bugs and suggests fixes",
+        instruction=(
+            "You are a helpful agent that analyzes Python code for potential bugs "
+            "and suggests fixes. You can identify syntax errors, logical errors, "
+            "and common programming mistakes. You can also safely execute code "
+            "to help identify runtime issues.\n\n"
+            "When analyzing code:\n"
+            "1. First check for syntax errors\n"
+            "2. Then look for logical bugs and security issues\n"
+            "3. Finally execute the code if it's safe to do so\n"
+            "4. Provide clear explanations and suggested fixes\n\n"
+            "When a message already contains the tool results, summarize them "
+            "without calling the tools again."
+        ),
+        tools=[
+            FunctionTool(analyze_code_async),
+            FunctionTool(suggest_fixes_async),
+            FunctionTool(execute_code_async),
+            FunctionTool(execute_many_async)
+        ],
+        before_model_callback=fast_path.before_model,
+        after_model_callback=fast_path.after_model
+    )
 
 # Create the root agent with tools
-root_agent = Agent(
-    name="bug_finder",
-    model="gemini-2.0-flash",
-    description="An agent that analyzes Python code for bugs and suggests fixes",
-    instruction=(
-        "You are a helpful agent that analyzes Python code for potential bugs "
-        "and suggests fixes. You can identify syntax errors, logical errors, "
-        "and common programming mistakes. You can also safely execute code "
-        "to help identify runtime issues.\n\n"
-        "When analyzing code:\n"
-        "1. First check for syntax errors\n"
-        "2. Then look for logical bugs and security issues\n"
-        "3. Finally execute the code if it's safe to do so\n"
-        "4. Provide clear explanations and suggested fixes"
-    ),
-    tools=[
-        FunctionTool(analyze_code),
-        FunctionTool(suggest_fixes),
-        FunctionTool(execute_code)
-    ]
-)
\ No newline at end of file
+root_agent = create_root_agent()
@@ -1,97 +1,75 @@
 """Code executor agent for safe code execution and runtime analysis."""
 
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from google.genai.types import ToolCodeExecution
-from pydantic import BaseModel, Field
 
-class ExecutionResult(BaseModel):
-    """Results from code execution."""
-    stdout: str = Field(description="Standard output from execution")
-    stderr: str = Field(description="Standard error output")
-    error: str = Field(description="Any error messages", default="")
-    execution_time: float = Field(description="Time taken to execute in seconds")
-    runtime_issues: list = Field(description="Any runtime issues detected", default_factory=list)
+from bug_finder import aio, engine, execution, sandbox
 
-def execute_code(code: str, timeout_seconds: int = 5) -> Dict[str, Any]:
+# Memory a snippet may add to its sandbox worker
+MAX_MEMORY_MB = 100
+
+def execute_code(
+    code: str,
+    timeout_seconds: float = 5,
+    profile: bool = False,
+    priority: int = 0,
+    monitor: bool = False
+) -> Dict[str, Any]:
     """Executes Python code in a safe environment.
     
     Args:
         code: The code to execute
         timeout_seconds: Maximum execution time allowed
+        profile: Whether to report the run's hot spots as performance issues
+        priority: Order of the run among those waiting for a sandbox
+            worker, lowest first
+        monitor: Whether to report line coverage, swallowed exceptions and
+            long-running loops as runtime issues
         
     Returns:
         Dict with execution results
     """
     start_time = time.time()
-    runtime_issues = []
     
-    # Create ADK code execution tool with strict security settings
-    code_executor = ToolCodeExecution(
-        timeout_seconds=timeout_seconds,
-        allowed_modules=[
-            "builtins", "math", "random", "datetime", "json",
-            "typing", "collections", "itertools", "functools"
-        ],
-        blocked_modules=[
-            "os", "sys", "subprocess", "importlib", "pathlib",
-            "socket", "requests", "urllib", "http", "ftp",
-            "telnetlib", "smtplib", "ftplib"
-        ],
-        max_iterations=1000,  # Prevent infinite loops
-        max_memory_mb=100     # Limit memory usage
-    )
+    # Run in a sandbox worker with the allowed modules only, under CPU-time,
+    # memory and output-size limits
+    limits = sandbox.Limits(memory_mb=MAX_MEMORY_MB)
     
     try:
         # Execute the code
-        result = code_executor.execute(code)
-        execution_time = time.time() - start_time
-        
-        # Check for potential runtime issues
-        if result.stderr:
-            runtime_issues.append({
-                "type": "runtime_error",
-                "description": result.stderr,
-                "severity": "high"
-            })
-        
-        # Check for memory usage warnings
-        if hasattr(result, 'memory_usage') and result.memory_usage > 50:  # Over 50MB
-            runtime_issues.append({
-                "type": "resource_usage",
-                "description": f"High memory usage: {result.memory_usage}MB",
-                "severity": "medium"
-            })
-        
-        return {
-            "status": "success",
-            "result": ExecutionResult(
-                stdout=result.stdout or "",
-                stderr=result.stderr or "",
-                error=result.error or "",
-                execution_time=execution_time,
-                runtime_issues=runtime_issues
-            ).dict()
-        }
+        result = sandbox.execute(code, timeout_seconds, limits, profile, monitor, priority)
+        flagged = {finding.line: finding.rule for finding in engine.analyze(code).findings} if monitor else {}
+        return execution.execution_result(result, limits, flagged)
         
     except Exception as e:
-        execution_time = time.time() - start_time
-        return {
-            "status": "error",
-            "result": ExecutionResult(
-                stdout="",
-                stderr="",
-                error=f"{type(e).__name__}: {str(e)}",
-                execution_time=execution_time,
-                runtime_issues=[{
-                    "type": "execution_error",
-                    "description": str(e),
-                    "severity": "high"
-                }]
-            ).dict()
-        }
+        return execution.error_result(e, time.time() - start_time)
+
+def execute_many(
+    snippets: List[str],
+    timeout_seconds: int = 5,
+    max_parallel: int = 4,
+    deadline_seconds: float = 60
+) -> Dict[str, Any]:
+    """Executes several snippets in parallel sandbox workers.
+    
+    Args:
+        snippets: The code snippets to execute
+        timeout_seconds: Maximum execution time allowed per snippet
+        max_parallel: Maximum number of snippets running at the same time
+        deadline_seconds: Time allowed for the whole batch; snippets not
+            started by then are skipped
+        
+    Returns:
+        Dict with execution results in the order of the snippets
+    """
+    limits = sandbox.Limits(memory_mb=MAX_MEMORY_MB)
+    results = sandbox.execute_many(snippets, timeout_seconds, max_parallel, deadline_seconds, limits)
+    return execution.batch_result(results, limits)
+
+execute_code_async = aio.sandbox_tool(execute_code)
+execute_many_async = aio.sandbox_tool(execute_many)
 
 # Create the code executor agent
 executor_agent = Agent(
@@ -106,5 +84,5 @@ executor_agent = Agent(
         "3. Detect runtime issues\n"
         "4. Provide execution results and metrics"
     ),
-    tools=[FunctionTool(execute_code)]
+    tools=[FunctionTool(execute_code_async), FunctionTool(execute_many_async)]
 ) 
\ No newline at end of file
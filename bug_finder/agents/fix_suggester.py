@@ -5,10 +5,14 @@ from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
 from pydantic import BaseModel, Field
 
+from bug_finder import aio, engine, fix_templates, patch, verify
+
 class CodeFix(BaseModel):
     """Suggested code fix."""
+    rule: str = Field(description="ID of the rule whose finding is being fixed", default="")
     issue_type: str = Field(description="Type of issue being fixed")
     line: int = Field(description="Line number where the fix should be applied")
+    end_line: int = Field(description="Last line replaced by the fix, if it spans several lines", default=0)
     original_code: str = Field(description="Original problematic code")
     suggested_fix: str = Field(description="Suggested code fix")
     explanation: str = Field(description="Explanation of why this fix is recommended")
@@ -21,57 +25,27 @@ def suggest_fixes(
     
     Args:
         code: Original source code
-        issues: List of issues found by other agents
+        issues: List of issues found by other agents, each with the ID of
+            the rule that produced it
         
     Returns:
         Dict with suggested fixes
     """
     fixes = []
-    lines = code.split('\n')
     
-    for issue in issues:
-        line_num = issue.get('line', 0)
-        issue_type = issue.get('type', '')
-        
-        if line_num > 0 and line_num <= len(lines):
-            original_line = lines[line_num - 1]
-            
-            if issue_type == "bare_except":
-                fixes.append(CodeFix(
-                    issue_type="logical",
-                    line=line_num,
-                    original_code=original_line,
-                    suggested_fix="except (ValueError, TypeError):",
-                    explanation="Specify the exceptions you want to catch instead of using a bare except"
-                ))
-                
-            elif issue_type == "hardcoded_secret":
-                fixes.append(CodeFix(
-                    issue_type="security",
-                    line=line_num,
-                    original_code=original_line,
-                    suggested_fix='secret = os.getenv("SECRET_KEY")',
-                    explanation="Use environment variables for sensitive data instead of hardcoding"
-                ))
-                
-            elif issue_type == "sql_injection":
-                fixes.append(CodeFix(
-                    issue_type="security",
-                    line=line_num,
-                    original_code=original_line,
-                    suggested_fix='cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))',
-                    explanation="Use parameterized queries to prevent SQL injection"
-                ))
-                
-            elif issue_type == "style":
-                if "print" in original_line:
-                    fixes.append(CodeFix(
-                        issue_type="style",
-                        line=line_num,
-                        original_code=original_line,
-                        suggested_fix='logging.info("Your message here")',
-                        explanation="Use logging instead of print statements in production code"
-                    ))
+    # Fixes are looked up by the rule ID of each issue, see bug_finder/fix_templates.py
+    for suggestion in fix_templates.suggest(code, issues):
+        # Issues whose fix cannot be written mechanically get no CodeFix
+        if suggestion.suggested_fix is None:
+            continue
+        fixes.append(CodeFix(
+            rule=suggestion.rule,
+            issue_type=suggestion.issue_type,
+            line=suggestion.line,
+            original_code=suggestion.original_code,
+            suggested_fix=suggestion.suggested_fix,
+            explanation=suggestion.explanation
+        ))
     
     return {
         "status": "success",
@@ -91,18 +65,89 @@ def apply_fix(
     Returns:
         Dict with modified code
     """
-    lines = code.split('\n')
-    if 0 < fix.line <= len(lines):
-        lines[fix.line - 1] = fix.suggested_fix
+    result = patch.apply(code, [fix])
+    if result.conflicts:
         return {
-            "status": "success",
-            "modified_code": '\n'.join(lines)
+            "status": "error",
+            "error": result.conflicts[0].reason
         }
+    _reanalyze(code, result.code)
+    return {
+        "status": "success",
+        "modified_code": result.code
+    }
+
+def apply_fixes(
+    code: str,
+    fixes: List[CodeFix]
+) -> Dict[str, Any]:
+    """Applies several suggested fixes to the code at once.
+    
+    Line numbers of all fixes refer to the original code. Fixes that
+    overlap an earlier fix, or whose original code no longer matches, are
+    skipped and reported as conflicts.
+    
+    Args:
+        code: Original source code
+        fixes: Fixes to apply
+        
+    Returns:
+        Dict with modified code, a unified diff and any conflicts
+    """
+    result = patch.apply(code, fixes)
+    _reanalyze(code, result.code)
     return {
-        "status": "error",
-        "error": "Invalid line number"
+        "status": "partial" if result.conflicts else "success",
+        "modified_code": result.code,
+        "diff": result.diff,
+        "applied": list(result.applied),
+        "conflicts": [conflict._asdict() for conflict in result.conflicts]
     }
 
+def verify_fixes(
+    code: str,
+    fixes: List[CodeFix],
+    execute: bool = False
+) -> Dict[str, Any]:
+    """Checks that suggested fixes compile and remove their findings.
+    
+    Each fix is applied on its own, and only the top-level definitions it
+    touches are re-parsed and re-checked by the rules that flagged them.
+    
+    Args:
+        code: Original source code
+        fixes: Fixes to verify
+        execute: Whether to also run the code with each fix in the sandbox
+        
+    Returns:
+        Dict with a verdict per fix ("accepted", "unverified", "rejected"
+        or "conflicting", with the reason and timings) and the code with
+        the accepted fixes applied
+    """
+    result = verify.verify(code, fixes, execute)
+    return {
+        "status": "success",
+        "verdicts": [verdict._asdict() for verdict in result.verdicts],
+        "accepted": [verdict.index for verdict in result.verdicts if verdict.status == "accepted"],
+        "unverified": [verdict.index for verdict in result.verdicts if verdict.status == "unverified"],
+        "modified_code": result.code,
+        "diff": result.diff,
+        "seconds": result.seconds
+    }
+
+def _reanalyze(code: str, modified_code: str) -> None:
+    # Re-analyze only the edited definitions now, so the follow-up
+    # analysis of the fixed code is a cache hit
+    previous = engine.cached(code)
+    if previous is not None and modified_code != code:
+        engine.analyze(modified_code, previous=previous)
+
+suggest_fixes_async = aio.analysis_tool(suggest_fixes)
+apply_fix_async = aio.analysis_tool(apply_fix)
+apply_fixes_async = aio.analysis_tool(apply_fixes)
+# Mostly waits on sandbox runs when it executes the fixes
+verify_fixes_async = aio.sandbox_tool(verify_fixes)
+
 # Create the fix suggester agent
 fix_agent = Agent(
     name="fix_suggester",
@@ -114,10 +159,13 @@ fix_agent = Agent(
         "1. Analyze reported issues\n"
         "2. Suggest appropriate fixes\n"
         "3. Provide clear explanations\n"
-        "4. Help apply the fixes safely"
+        "4. Verify the fixes before suggesting them\n"
+        "5. Help apply the fixes safely"
     ),
     tools=[
-        FunctionTool(suggest_fixes),
-        FunctionTool(apply_fix)
+        FunctionTool(suggest_fixes_async),
+        FunctionTool(apply_fix_async),
+        FunctionTool(apply_fixes_async),
+        FunctionTool(verify_fixes_async)
     ]
 ) 
\ No newline at end of file
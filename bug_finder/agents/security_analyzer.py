@@ -1,11 +1,12 @@
 """Security analyzer agent for finding security vulnerabilities."""
 
-import ast
 from typing import Dict, Any, List
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
 from pydantic import BaseModel, Field
 
+from bug_finder import aio, engine
+
 class SecurityIssue(BaseModel):
     """Security issue found in code."""
     type: str = Field(description="Type of security issue")
@@ -23,63 +24,20 @@ def analyze_security(code: str) -> Dict[str, Any]:
     Returns:
         Dict with security analysis results
     """
-    issues = []
+    report = engine.analyze(code)
     
-    try:
-        tree = ast.parse(code)
-        
-        for node in ast.walk(tree):
-            # Check for hardcoded secrets
-            if isinstance(node, ast.Assign):
-                for target in node.targets:
-                    if isinstance(target, ast.Name):
-                        name = target.id.lower()
-                        if any(secret in name for secret in ['password', 'secret', 'key', 'token']):
-                            if isinstance(node.value, ast.Constant):
-                                issues.append(SecurityIssue(
-                                    type="hardcoded_secret",
-                                    line=node.lineno,
-                                    description="Possible hardcoded secret detected",
-                                    severity="high",
-                                    cwe_id="CWE-798"
-                                ))
-            
-            # Check for dangerous eval/exec usage
-            elif isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Name):
-                    if node.func.id in ['eval', 'exec']:
-                        issues.append(SecurityIssue(
-                            type="code_execution",
-                            line=node.lineno,
-                            description=f"Dangerous use of {node.func.id}() detected",
-                            severity="high",
-                            cwe_id="CWE-95"
-                        ))
-            
-            # Check for SQL injection vulnerabilities
-            elif isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Attribute):
-                    if node.func.attr in ['execute', 'executemany']:
-                        # Check if using string formatting or concatenation
-                        if any(isinstance(arg, (ast.BinOp, ast.Call)) for arg in node.args):
-                            issues.append(SecurityIssue(
-                                type="sql_injection",
-                                line=node.lineno,
-                                description="Possible SQL injection vulnerability",
-                                severity="high",
-                                cwe_id="CWE-89"
-                            ))
-        
-        return {
-            "status": "success",
-            "issues": [issue.dict() for issue in issues]
-        }
-        
-    except SyntaxError as e:
+    if report.syntax_error:
         return {
             "status": "error",
-            "error": str(e)
+            "error": report.syntax_error[1]
         }
+    
+    return {
+        "status": "success",
+        "issues": engine.render(report, "security")
+    }
+
+analyze_security_async = aio.analysis_tool(analyze_security)
 
 # Create the security analyzer agent
 security_agent = Agent(
@@ -94,5 +52,5 @@ security_agent = Agent(
         "3. Assess severity of security issues\n"
         "4. Suggest secure coding practices"
     ),
-    tools=[FunctionTool(analyze_security)]
+    tools=[FunctionTool(analyze_security_async)]
 ) 
\ No newline at end of file
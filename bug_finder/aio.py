@@ -0,0 +1,102 @@
+"""Async variants of the agent tools.
+
+ADK awaits coroutine tools on the server's event loop, so a synchronous
+tool stalls every session while it runs. The wrappers here run the tool in
+a thread pool instead: CPU-bound analysis in a pool sized by the CPU count,
+and sandbox runs, which mostly wait on a worker process, in a larger pool
+of their own so that queued executions never hold up analysis.
+
+A wrapped tool keeps the name, docstring and signature of the original,
+so the model sees the same tool either way.
+
+A thread cannot be stopped from outside, so cancelling the coroutine only
+sets the ``cancelled()`` event of the call; long waits in the thread, such
+as a sandbox run, check it and give up.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+# Threads waiting on sandbox runs; runs beyond the sandbox pool's size
+# queue for a worker inside these threads
+DEFAULT_SANDBOX_THREADS = 64
+
+_executors = {}
+_lock = threading.Lock()
+
+# Event of the pool call the current thread is running
+_cancelled: "contextvars.ContextVar[Optional[threading.Event]]" = contextvars.ContextVar(
+    "bug_finder_cancelled", default=None
+)
+
+
+def _executor(kind: str) -> concurrent.futures.ThreadPoolExecutor:
+    """Returns the shared pool for "analysis" or "sandbox" tools.
+
+    Sized by ``BUG_FINDER_ANALYSIS_THREADS`` (default: the CPU count) and
+    ``BUG_FINDER_SANDBOX_THREADS`` respectively.
+    """
+    with _lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            if kind == "analysis":
+                size = int(os.getenv("BUG_FINDER_ANALYSIS_THREADS", 0)) or os.cpu_count() or 1
+            else:
+                size = int(os.getenv("BUG_FINDER_SANDBOX_THREADS", DEFAULT_SANDBOX_THREADS))
+            executor = _executors[kind] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix=f"bug_finder_{kind}"
+            )
+        return executor
+
+
+def cancelled() -> Optional[threading.Event]:
+    """Event set once the caller of the running ``run_in_pool`` call is cancelled.
+
+    None outside of a pool call.
+    """
+    return _cancelled.get()
+
+
+def run_in_pool(kind: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Awaitable[Any]:
+    """Runs ``func`` in the ``kind`` pool with the caller's context variables.
+
+    Cancelling the returned future sets ``cancelled()`` in the thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    event = threading.Event()
+    context.run(_cancelled.set, event)
+    future = loop.run_in_executor(_executor(kind), functools.partial(context.run, func, *args, **kwargs))
+    future.add_done_callback(lambda done: event.set() if done.cancelled() else None)
+    return future
+
+
+def _async_tool(kind: str, func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(func)
+    async def tool(*args: Any, **kwargs: Any) -> Any:
+        return await run_in_pool(kind, func, *args, **kwargs)
+    return tool
+
+
+def analysis_tool(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    """Async version of a CPU-bound analysis tool."""
+    return _async_tool("analysis", func)
+
+
+def sandbox_tool(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    """Async version of a tool that executes code in the sandbox."""
+    return _async_tool("sandbox", func)
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stops the shared pools; they are started again on the next call."""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,229 @@
+"""Content-addressed caches for parsed trees and analysis results."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+DEFAULT_MAXSIZE = 256
+# Trees are looked up when a result misses and by other passes over the same
+# source (e.g. the cost estimate), so they follow the result cache's size
+DEFAULT_TREE_MAXSIZE = DEFAULT_MAXSIZE
+
+
+def content_hash(text: str) -> str:
+    """Returns a stable hex digest of ``text``."""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize
+        }
+
+
+class TTLCache(LRUCache):
+    """``LRUCache`` whose entries expire ``ttl`` seconds after they were stored."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expired = 0
+        self._clock = clock
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires <= self._clock():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            # Drop expired entries from the least recently used end first
+            while self._data and next(iter(self._data.values()))[0] <= now:
+                self._data.popitem(last=False)
+                self.expired += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["expired"] = self.expired
+        stats["ttl"] = self.ttl
+        return stats
+
+
+class DiskStore:
+    """Directory of JSON documents addressed by key."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[-2:], f"{key}.json")
+
+    def load(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def save(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see partial data
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except (OSError, TypeError, ValueError):
+            # A full disk or a value that is not JSON-serializable
+            pass
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "directory": self.directory
+        }
+
+
+class AnalysisCache:
+    """Parsed trees and analysis results, keyed by source hash and rule-set version.
+
+    Results can also be persisted to ``directory`` so they survive server
+    restarts; ``encode`` and ``decode`` convert them to and from JSON-compatible
+    values. Parsed trees are only kept in memory.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        tree_maxsize: int = DEFAULT_TREE_MAXSIZE,
+        directory: Optional[str] = None,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value
+    ):
+        self.trees = LRUCache(tree_maxsize)
+        self.results = LRUCache(maxsize)
+        self.disk = DiskStore(directory) if directory else None
+        self.encode = encode
+        self.decode = decode
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> "AnalysisCache":
+        """Builds a cache configured by the ``BUG_FINDER_*CACHE*`` variables."""
+        maxsize = int(os.getenv("BUG_FINDER_CACHE_SIZE", DEFAULT_MAXSIZE))
+        return cls(
+            maxsize=maxsize,
+            # The tree cache follows the result cache unless sized on its own
+            tree_maxsize=int(os.getenv("BUG_FINDER_TREE_CACHE_SIZE", maxsize)),
+            directory=os.getenv("BUG_FINDER_CACHE_DIR") or None,
+            **kwargs
+        )
+
+    def get_result(self, key: str) -> Optional[Any]:
+        """Returns the cached result for ``key``, falling back to disk."""
+        value = self.results.get(key)
+        if value is None and self.disk is not None:
+            stored = self.disk.load(key)
+            if stored is not None:
+                value = self.decode(stored)
+                self.results.put(key, value)
+        return value
+
+    def put_result(self, key: str, value: Any) -> None:
+        self.results.put(key, value)
+        if self.disk is not None:
+            self.disk.save(key, self.encode(value))
+
+    def clear(self) -> None:
+        """Drops the in-memory entries; the on-disk store is left untouched."""
+        self.trees.clear()
+        self.results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "trees": self.trees.stats(),
+            "results": self.results.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
@@ -0,0 +1,458 @@
+"""Static estimate of how expensive a snippet is to execute.
+
+The estimate counts the statements the snippet would run, multiplying the
+statements in a loop body by the loop's iteration count: the constant bound
+of a ``range()`` or literal when there is one, ``UNKNOWN_ITERATIONS``
+otherwise. Calls to functions defined in the snippet add the cost of their
+body, scaled up for recursion, and large constant allocations add their
+size. Loops that can never end and recursion without a base case make the
+snippet "unbounded".
+
+``admit`` turns an estimate into an admission decision for the sandbox.
+"""
+
+import ast
+import math
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bug_finder import engine
+
+# Cost classes, cheapest first. The index of a class is the sandbox
+# priority of its runs.
+COST_CLASSES = ("cheap", "moderate", "expensive", "unbounded")
+
+# Estimated operations from which a snippet is moderate or expensive
+MODERATE_OPERATIONS = 10 ** 5
+EXPENSIVE_OPERATIONS = 10 ** 7
+
+# Iterations assumed for a loop whose bound is not a constant
+UNKNOWN_ITERATIONS = 100
+
+# Calls assumed for a function that calls itself once (Python's default
+# recursion limit), and for one that calls itself more than once
+RECURSIVE_CALLS = 1000
+EXPONENTIAL_CALLS = 10 ** 7
+
+# Constant loop bounds and allocation sizes worth a reason of their own
+LARGE_LOOP = 10 ** 6
+LARGE_ALLOCATION = 10 ** 6
+
+# Loop nesting depth worth a reason of its own
+DEEP_NESTING = 3
+
+# Timeout given to expensive snippets, in seconds
+EXPENSIVE_TIMEOUT = 1.0
+
+# Magnitude at which folded constants saturate, so that e.g. ``10**64**4``
+# is not computed digit by digit
+MAX_CONSTANT = 10 ** 18
+
+# Estimated operations saturate here instead of overflowing
+MAX_OPERATIONS = 1e30
+
+# Marks an iterator that never ends, e.g. ``itertools.count()``
+INFINITE = math.inf
+
+# Builtins that consume the whole iterable they are given, and those of
+# them that build a collection of its items
+_CONSUMING_BUILTINS = frozenset({"list", "tuple", "set", "dict", "sorted", "sum", "min", "max"})
+_COLLECTING_BUILTINS = frozenset({"list", "tuple", "set", "dict", "sorted"})
+
+# Builtins that iterate lazily over their first argument
+_WRAPPING_BUILTINS = frozenset({"enumerate", "zip", "reversed"})
+
+# Nodes that let a function return without recursing
+_BRANCHES = (ast.If, ast.IfExp, ast.For, ast.While, ast.Try, ast.BoolOp) + (
+    (ast.Match,) if hasattr(ast, "Match") else ()
+)
+
+
+class CostEstimate(NamedTuple):
+    """Static cost of a snippet."""
+    cost_class: str
+    # Estimated statements executed, including allocated elements
+    operations: float
+    max_loop_depth: int
+    # (line, description) of what makes the snippet expensive or unbounded
+    reasons: Tuple[Tuple[int, str], ...] = ()
+
+
+class Admission(NamedTuple):
+    """Whether and how a snippet should be executed."""
+    run: bool
+    timeout: float
+    # Lower values get a sandbox worker first
+    priority: int
+    reason: str = ""
+
+
+def _clamp(value: int) -> int:
+    return max(-MAX_CONSTANT, min(value, MAX_CONSTANT))
+
+
+def _constant(node: ast.expr) -> Optional[int]:
+    """Value of an integer expression built from literals, or None.
+
+    Values saturate at ``MAX_CONSTANT`` either way.
+    """
+    value = _folded(node)
+    return _clamp(value) if value is not None else None
+
+
+def _folded(node: ast.expr) -> Optional[int]:
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _constant(node.operand)
+        return -value if value is not None else None
+    if isinstance(node, ast.BinOp):
+        # Operands are clamped before they are combined
+        left, right = _constant(node.left), _constant(node.right)
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.FloorDiv) and right:
+            return left // right
+        if isinstance(node.op, ast.Pow) and 0 <= right <= 64:
+            # Operands are at most MAX_CONSTANT, so this has at most ~1200 digits
+            return left ** right
+    return None
+
+
+def _call_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Call):
+        if isinstance(node.func, ast.Name):
+            return node.func.id
+        if isinstance(node.func, ast.Attribute):
+            return node.func.attr
+    return None
+
+
+def _iterations(node: ast.expr) -> Optional[float]:
+    """Number of items ``node`` yields when iterated, or None when unknown."""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return len(node.elts)
+    if isinstance(node, ast.Dict):
+        return len(node.keys)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes)):
+        return len(node.value)
+    name = _call_name(node)
+    if name == "range" and 1 <= len(node.args) <= 3:
+        bounds = [_constant(arg) for arg in node.args]
+        if None in bounds:
+            return None
+        start, stop, step = (0, bounds[0], 1) if len(bounds) == 1 else (bounds + [1])[:3]
+        if step == 0:
+            return None
+        return max(0, -((start - stop) // step))
+    if name in ("count", "cycle", "repeat") and not (name == "repeat" and len(node.args) > 1):
+        return INFINITE
+    if name in _WRAPPING_BUILTINS and node.args:
+        return _iterations(node.args[0])
+    return None
+
+
+def _suspends(statement: ast.AST) -> bool:
+    """Whether ``statement`` yields or awaits, outside nested definitions."""
+    stack = [statement]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Yield, ast.YieldFrom, ast.Await, ast.AsyncFor, ast.AsyncWith)):
+            return True
+        if node is not statement and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+
+def _exits(statements: List[ast.AST]) -> bool:
+    """Whether a loop body can leave its loop through break, return or raise.
+
+    A body that yields or awaits counts too: the loop then runs only as
+    long as its consumer or event loop resumes it, as in a generator.
+    """
+    for statement in statements:
+        if isinstance(statement, (ast.Break, ast.Return, ast.Raise)):
+            return True
+        if not isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and _suspends(statement):
+            return True
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(statement, (ast.For, ast.AsyncFor, ast.While)):
+            # A break inside a nested loop only leaves that loop
+            if _exits(statement.orelse) or any(
+                isinstance(node, (ast.Return, ast.Raise)) for node in ast.walk(statement)
+            ):
+                return True
+            continue
+        for field in ("body", "orelse", "finalbody", "handlers", "cases"):
+            children = getattr(statement, field, None)
+            if isinstance(children, list) and _exits(children):
+                return True
+    return False
+
+
+def _always_true(node: ast.expr) -> bool:
+    return isinstance(node, ast.Constant) and bool(node.value)
+
+
+def _times(a: float, b: float) -> float:
+    """``a * b``, saturating at ``MAX_OPERATIONS``."""
+    if not a or not b:
+        return 0.0
+    return min(float(a) * float(b), MAX_OPERATIONS)
+
+
+def _plus(a: float, b: float) -> float:
+    return min(a + b, MAX_OPERATIONS)
+
+
+class _FunctionCost(NamedTuple):
+    operations: float
+    unbounded: Tuple[Tuple[int, str], ...]
+    reasons: Tuple[Tuple[int, str], ...]
+    max_loop_depth: int
+
+
+class _CostVisitor(ast.NodeVisitor):
+    """Sums the estimated operations of the statements it visits."""
+
+    def __init__(self, functions: Dict[str, _FunctionCost]):
+        self.functions = functions
+        self.multiplier = 1.0
+        self.depth = 0
+        self.max_loop_depth = 0
+        self.operations = 0.0
+        self.unbounded: List[Tuple[int, str]] = []
+        self.reasons: List[Tuple[int, str]] = []
+
+    def visit(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.stmt):
+            self.operations = _plus(self.operations, self.multiplier)
+        return super().visit(node)
+
+    def _visit_all(self, nodes: List[ast.AST]) -> None:
+        for node in nodes:
+            self.visit(node)
+
+    def _loop(self, iterations: float, body: List[ast.stmt]) -> None:
+        outer = self.multiplier
+        self.multiplier = _times(outer, iterations)
+        self.depth += 1
+        self.max_loop_depth = max(self.max_loop_depth, self.depth)
+        if self.depth == DEEP_NESTING:
+            self.reasons.append((body[0].lineno, f"loops nested {DEEP_NESTING} deep"))
+        self._visit_all(body)
+        self.depth -= 1
+        self.multiplier = outer
+
+    def _bound(self, node: ast.AST, iterable: ast.expr, can_exit: bool, report: bool = True) -> float:
+        iterations = _iterations(iterable)
+        if iterations is None:
+            return UNKNOWN_ITERATIONS
+        if iterations == INFINITE:
+            if not can_exit:
+                self.unbounded.append((node.lineno, "iterates over an infinite iterator and never breaks"))
+            return UNKNOWN_ITERATIONS
+        if iterations >= LARGE_LOOP and report:
+            self.reasons.append((node.lineno, f"loops {iterations:,} times"))
+        return iterations
+
+    def visit_For(self, node: ast.For) -> None:
+        self.visit(node.target)
+        self.visit(node.iter)
+        self._loop(self._bound(node, node.iter, _exits(node.body)), node.body)
+        self._visit_all(node.orelse)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node: ast.While) -> None:
+        self.visit(node.test)
+        if _always_true(node.test) and not _exits(node.body):
+            self.unbounded.append((node.lineno, "loops forever: the condition is always true and nothing breaks out"))
+        self._loop(UNKNOWN_ITERATIONS, node.body)
+        self._visit_all(node.orelse)
+
+    def _comprehension(self, node: ast.expr, elements: List[ast.expr]) -> None:
+        outer = self.multiplier
+        collects = not isinstance(node, ast.GeneratorExp)
+        for generator in node.generators:
+            self.visit(generator.iter)
+            self.multiplier = _times(self.multiplier, self._bound(node, generator.iter, False, report=not collects))
+            self._visit_all(generator.ifs)
+        self.operations = _plus(self.operations, self.multiplier)
+        size = self.multiplier / outer if outer else 0.0
+        if size >= LARGE_ALLOCATION and collects:
+            self.reasons.append((node.lineno, f"builds a collection of {size:,.0f} items"))
+        self._visit_all(elements)
+        self.multiplier = outer
+
+    def visit_ListComp(self, node: ast.ListComp) -> None:
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node: ast.DictComp) -> None:
+        self._comprehension(node, [node.key, node.value])
+
+    def _allocate(self, node: ast.AST, size: float) -> None:
+        self.operations = _plus(self.operations, _times(size, self.multiplier))
+        if size >= LARGE_ALLOCATION:
+            self.reasons.append((node.lineno, f"allocates {size:,.0f} items"))
+
+    def visit_BinOp(self, node: ast.BinOp) -> None:
+        if isinstance(node.op, ast.Mult):
+            for sequence, count in ((node.left, node.right), (node.right, node.left)):
+                length = _iterations(sequence) if isinstance(sequence, (ast.List, ast.Tuple, ast.Constant)) else None
+                times = _constant(count)
+                if length is not None and times is not None:
+                    self._allocate(node, _times(length, max(times, 0)))
+                    break
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name in self.functions:
+            function = self.functions[name]
+            self.operations = _plus(self.operations, _times(function.operations, self.multiplier))
+            self.unbounded.extend(function.unbounded)
+            self.reasons.extend(function.reasons)
+            self.max_loop_depth = max(self.max_loop_depth, self.depth + function.max_loop_depth)
+        elif name in _CONSUMING_BUILTINS and node.args:
+            items = _iterations(node.args[0])
+            if items == INFINITE:
+                self.unbounded.append((node.lineno, f"{name}() consumes an infinite iterator"))
+            elif items is not None and name in _COLLECTING_BUILTINS:
+                self._allocate(node, items)
+            elif items is not None:
+                self.operations = _plus(self.operations, _times(items, self.multiplier))
+                if items >= LARGE_LOOP:
+                    self.reasons.append((node.lineno, f"loops {items:,} times in {name}()"))
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        # The body is costed where the function is called
+        self._visit_all(node.decorator_list)
+        self.visit(node.args)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        self.visit(node.args)
+
+
+def _function_cost(node: ast.FunctionDef, functions: Dict[str, _FunctionCost]) -> _FunctionCost:
+    visitor = _CostVisitor(functions)
+    visitor._visit_all(node.body)
+    operations = visitor.operations
+    self_calls = sum(
+        1 for child in ast.walk(node)
+        if isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and child.func.id == node.name
+    )
+    if self_calls:
+        if not any(isinstance(child, _BRANCHES) for statement in node.body for child in ast.walk(statement)):
+            visitor.unbounded.append((node.lineno, f"{node.name}() calls itself with no base case"))
+        elif self_calls > 1:
+            operations = _times(operations, EXPONENTIAL_CALLS)
+            visitor.reasons.append((node.lineno, f"{node.name}() calls itself {self_calls} times per call"))
+        else:
+            operations = _times(operations, RECURSIVE_CALLS)
+            visitor.reasons.append((node.lineno, f"{node.name}() is recursive"))
+    return _FunctionCost(
+        operations, tuple(visitor.unbounded), tuple(visitor.reasons), visitor.max_loop_depth
+    )
+
+
+def _cost_class(operations: float, unbounded: bool) -> str:
+    if unbounded:
+        return "unbounded"
+    if operations >= EXPENSIVE_OPERATIONS:
+        return "expensive"
+    if operations >= MODERATE_OPERATIONS:
+        return "moderate"
+    return "cheap"
+
+
+def _unique(reasons: List[Tuple[int, str]]) -> Tuple[Tuple[int, str], ...]:
+    seen: Set[Tuple[int, str]] = set()
+    return tuple(reason for reason in reasons if not (reason in seen or seen.add(reason)))
+
+
+def estimate(code: str) -> CostEstimate:
+    """Estimates the cost of executing ``code`` without running it.
+
+    Functions are costed in the order they are defined, so a call to a
+    function defined later in the snippet counts as a single operation.
+    Snippets that do not parse are cheap: they fail before running.
+    Snippets too deeply nested to walk are expensive, so they still run,
+    with a shorter timeout.
+    """
+    try:
+        tree = engine.parse(code)
+    except (SyntaxError, ValueError):
+        return CostEstimate("cheap", 0.0, 0)
+    except (RecursionError, MemoryError):
+        return _too_complex()
+    try:
+        return _estimate(tree)
+    except (RecursionError, MemoryError):
+        return _too_complex()
+
+
+def _too_complex() -> CostEstimate:
+    return CostEstimate("expensive", float(EXPENSIVE_OPERATIONS), 0, ((1, "is too deeply nested to estimate"),))
+
+
+def _estimate(tree: ast.Module) -> CostEstimate:
+    functions: Dict[str, _FunctionCost] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = _function_cost(node, functions)
+
+    visitor = _CostVisitor(functions)
+    visitor._visit_all(tree.body)
+    unbounded = _unique(visitor.unbounded)
+    return CostEstimate(
+        _cost_class(visitor.operations, bool(unbounded)),
+        visitor.operations,
+        visitor.max_loop_depth,
+        unbounded or _unique(visitor.reasons)
+    )
+
+
+def admit(cost: CostEstimate, timeout: float) -> Admission:
+    """Decides whether and how to execute a snippet of the given cost.
+
+    Unbounded snippets are not run, since they would only burn the whole
+    timeout. Expensive snippets run with a shorter timeout. Every run gets
+    the priority of its cost class, so cheap snippets get workers first.
+    """
+    priority = COST_CLASSES.index(cost.cost_class)
+    reason = "; ".join(f"line {line}: {description}" for line, description in cost.reasons)
+    if cost.cost_class == "unbounded":
+        return Admission(False, 0.0, priority, f"Execution skipped, the code never finishes ({reason})")
+    if cost.cost_class == "expensive":
+        return Admission(True, min(timeout, EXPENSIVE_TIMEOUT), priority, f"Expensive code, timeout shortened ({reason})")
+    return Admission(True, timeout, priority)
+
+
+def issues(cost: CostEstimate) -> List[Dict[str, Any]]:
+    """Issues for the loops and recursion that make a snippet unbounded."""
+    if cost.cost_class != "unbounded":
+        return []
+    return [
+        {
+            "type": "performance",
+            "kind": "unbounded",
+            "rule": "unbounded",
+            "line": line,
+            "description": f"Line {line} {description}",
+            "severity": "high"
+        }
+        for line, description in cost.reasons
+    ]
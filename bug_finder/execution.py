@@ -0,0 +1,153 @@
+"""Tool results for sandbox runs.
+
+The root agent's and the code executor agent's ``execute_code`` and
+``execute_many`` tools both build their results here, so they report runs,
+runtime issues and batch summaries in the same shape.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from bug_finder import monitoring, profiling, sandbox
+
+# Sandbox statuses of runs that never started or were stopped unfinished
+NOT_RUN = ("skipped", "cancelled")
+
+
+class ExecutionResult(BaseModel):
+    """Results from code execution."""
+    stdout: str = Field(description="Standard output from execution")
+    stderr: str = Field(description="Standard error output")
+    error: str = Field(description="Any error messages", default="")
+    execution_time: float = Field(description="Time taken to execute in seconds")
+    runtime_issues: list = Field(description="Any runtime issues detected", default_factory=list)
+    peak_rss_mb: float = Field(description="Peak resident memory of the sandbox worker in MB", default=0.0)
+    memory_used_mb: float = Field(description="Memory the code added to the worker at its peak, in MB", default=0.0)
+    cpu_user_time: float = Field(description="User CPU time in seconds", default=0.0)
+    cpu_system_time: float = Field(description="System CPU time in seconds", default=0.0)
+    allocated_blocks: int = Field(description="Memory blocks still allocated by the code when it finished", default=0)
+    output_chars: int = Field(description="Characters written to stdout and stderr", default=0)
+    cached: bool = Field(description="Whether the result came from the execution cache", default=False)
+    profile: dict = Field(description="Top functions, lines and allocation sites, when profiled", default_factory=dict)
+    monitor: dict = Field(description="Line coverage, swallowed exceptions and long loops, when monitored", default_factory=dict)
+
+
+def runtime_issues(
+    result: Dict[str, Any],
+    limits: sandbox.Limits,
+    flagged: Optional[Dict[int, str]] = None
+) -> List[Dict[str, Any]]:
+    """Runtime issues of a sandbox run.
+
+    Args:
+        result: The ``sandbox.execute`` result
+        limits: The limits the run was held to
+        flagged: Rule IDs of the statically flagged lines, by line, for
+            the monitoring issues
+    """
+    issues = []
+    if result["status"] == "timeout":
+        issues.append({
+            "type": "timeout",
+            "rule": "timeout",
+            "description": result["message"],
+            "severity": "high"
+        })
+    elif result["status"] != "success" and not result["limit_exceeded"]:
+        issues.append({
+            "type": "execution_error",
+            "rule": "execution_error",
+            "description": result["message"],
+            "severity": "high"
+        })
+    elif result["stderr"]:
+        issues.append({
+            "type": "runtime_error",
+            "rule": "runtime_error",
+            "description": result["stderr"],
+            "severity": "high"
+        })
+    # CPU, memory and output usage near or over the limits
+    issues.extend(sandbox.resource_issues(result, limits))
+    # The slowest lines and functions and the biggest allocators
+    issues.extend(profiling.performance_issues(result["profile"]))
+    # Swallowed exceptions, long loops and flagged lines that never ran
+    issues.extend(monitoring.monitoring_issues(result["monitor"], flagged or {}))
+    return issues
+
+
+def execution_result(
+    result: Dict[str, Any],
+    limits: sandbox.Limits,
+    flagged: Optional[Dict[int, str]] = None
+) -> Dict[str, Any]:
+    """``execute_code`` result of a sandbox run.
+
+    Returns:
+        Dict with the status, "success", "error" (the code raised, timed
+        out or went over a limit) or one of ``NOT_RUN``, and the
+        ``ExecutionResult`` as a dict
+    """
+    if result["status"] in NOT_RUN:
+        return {
+            "status": result["status"],
+            "result": ExecutionResult(
+                stdout="",
+                stderr="",
+                error=result["message"],
+                execution_time=result["execution_time"]
+            ).dict()
+        }
+
+    return {
+        "status": "success" if result["status"] == "success" else "error",
+        "result": ExecutionResult(
+            stdout=result["stdout"],
+            stderr=result["stderr"],
+            error=result["error"],
+            execution_time=result["execution_time"],
+            runtime_issues=runtime_issues(result, limits, flagged),
+            cached=result["cached"],
+            profile=result["profile"],
+            monitor=result["monitor"],
+            **result["usage"]
+        ).dict()
+    }
+
+
+def error_result(error: Exception, execution_time: float) -> Dict[str, Any]:
+    """``execute_code`` result for a run the sandbox could not carry out."""
+    return {
+        "status": "error",
+        "result": ExecutionResult(
+            stdout="",
+            stderr="",
+            error=f"{type(error).__name__}: {str(error)}",
+            execution_time=execution_time,
+            runtime_issues=[{
+                "type": "execution_error",
+                "rule": "execution_error",
+                "description": str(error),
+                "severity": "high"
+            }]
+        ).dict()
+    }
+
+
+def batch_result(results: List[Dict[str, Any]], limits: sandbox.Limits) -> Dict[str, Any]:
+    """``execute_many`` result of a batch of sandbox runs, in snippet order."""
+    executions = [execution_result(result, limits) for result in results]
+    skipped = sum(1 for execution in executions if execution["status"] in NOT_RUN)
+
+    return {
+        "status": "partial" if skipped else "success",
+        "results": executions,
+        "summary": {
+            "total": len(executions),
+            "succeeded": sum(1 for execution in executions if execution["status"] == "success"),
+            "failed": sum(1 for execution in executions if execution["status"] == "error"),
+            "skipped": skipped,
+            "with_runtime_issues": sum(1 for execution in executions if execution["result"]["runtime_issues"])
+        }
+    }
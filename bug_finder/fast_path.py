@@ -0,0 +1,339 @@
+"""Answers plain code submissions to the root agent without tool round trips.
+
+For a message that is just code, or code with a short "find the bugs"
+request, the model would always call ``analyze_code``, ``suggest_fixes``
+and, when the code looks safe to run, ``execute_code``, one model round
+trip each. ``FastPath.before_model`` recognizes such messages and runs the
+tools itself before the first model call. In "summarize" mode the results
+are handed to the model, with the tools removed, to be summarized in a
+single call; in "direct" mode the model is skipped and a report is
+rendered from the results. Every other message goes to the model as usual.
+
+Answers are kept in a response cache keyed by a hash of the model, the
+mode, the request and the code, and expire after a time-to-live, so the
+same submission is answered from memory until the tools or the model may
+have changed their mind.
+"""
+
+import ast
+import asyncio
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from bug_finder import aio, cost, monitoring
+from bug_finder.cache import TTLCache, content_hash
+
+# "summarize": the model summarizes the tool results; "direct": the model
+# is skipped; "off": every message goes to the model
+MODES = ("summarize", "direct", "off")
+DEFAULT_MODE = "summarize"
+
+# Answers kept in memory, and seconds each one is served for
+DEFAULT_RESPONSE_CACHE_SIZE = 256
+DEFAULT_RESPONSE_CACHE_TTL = 3600.0
+
+# Time limit passed to execute_code
+EXECUTION_TIMEOUT = 5
+
+# Seconds the cost estimate may take; code that takes longer is not run
+ESTIMATE_TIMEOUT = 2.0
+
+# Longest request around a code block that still counts as "find the bugs"
+MAX_PROMPT_WORDS = 12
+
+# Characters of stdout and stderr passed to the model for summarizing
+MAX_OUTPUT_CHARS = 2000
+
+_FENCE = re.compile(r"```[ \t]*(?:python3?|py)?[ \t]*\r?\n(.*?)```", re.DOTALL | re.IGNORECASE)
+_BUG_WORDS = re.compile(
+    r"\b(?:bugs?|issues?|errors?|problems?|mistakes?|wrong|broken|check|analy[sz]e|review|debug|fix|scan)\b",
+    re.IGNORECASE
+)
+# Requests that need more than the bug finding tools
+_OTHER_WORDS = re.compile(
+    r"\b(?:explain|why|how|rewrite|refactor|convert|translate|optimi[sz]e|document|test|compare|implement|add)\b",
+    re.IGNORECASE
+)
+
+# Session state entry holding the cache key of the answer the model is writing
+_STATE_KEY = "temp:bug_finder_response_key"
+
+_SUMMARY_REQUEST = (
+    "The bug finder tools already ran on the code above; their results "
+    "follow as JSON. Summarize the bugs found, the suggested fixes and how "
+    "the code behaved when run, for the user. Do not call any tools."
+)
+
+
+class Submission(NamedTuple):
+    """A message recognized as a request to find the bugs in ``code``."""
+    # The message without the code, e.g. "find the bugs in this"
+    prompt: str
+    code: str
+
+
+def _is_program(code: str) -> bool:
+    """Whether ``code`` parses as Python and is more than a bare word or value."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    if not tree.body:
+        return False
+    return "\n" in code.strip() or not all(
+        isinstance(statement, ast.Expr) and isinstance(statement.value, (ast.Name, ast.Constant))
+        for statement in tree.body
+    )
+
+
+def recognize(message: str) -> Optional[Submission]:
+    """Recognizes a plain code submission.
+
+    That is a message made of a single code block, optionally with a short
+    request to find its bugs, or a message that is Python source as a whole.
+
+    Returns:
+        The request and the code, or None if the model should handle the
+        message
+    """
+    blocks = _FENCE.findall(message)
+    if len(blocks) > 1:
+        return None
+    if not blocks:
+        code = message.strip('\r\n')
+        return Submission("", code) if _is_program(code) else None
+    code = blocks[0]
+    prompt = " ".join(_FENCE.sub(" ", message).split())
+    if not code.strip():
+        return None
+    if prompt and (
+        len(prompt.split()) > MAX_PROMPT_WORDS
+        or not _BUG_WORDS.search(prompt)
+        or _OTHER_WORDS.search(prompt)
+    ):
+        return None
+    return Submission(prompt, code)
+
+
+def cache_key(model: str, mode: str, submission: Submission) -> str:
+    """Key of the answer to ``submission``; the request is compared case- and space-insensitively."""
+    prompt = " ".join(submission.prompt.lower().split())
+    return content_hash(json.dumps([model, mode, prompt, submission.code]))
+
+
+def _message(llm_request: LlmRequest) -> Optional[str]:
+    """Text of the user message a request starts a turn with, or None.
+
+    Later model calls of the same turn end with tool responses instead.
+    """
+    if not llm_request.contents:
+        return None
+    content = llm_request.contents[-1]
+    if content.role != "user" or not content.parts:
+        return None
+    if any(part.text is None for part in content.parts):
+        return None
+    return "".join(part.text for part in content.parts)
+
+
+def _text(llm_response: LlmResponse) -> Optional[str]:
+    """Text of a complete model answer, or None if it is partial or calls a tool."""
+    if llm_response.partial or llm_response.content is None or not llm_response.content.parts:
+        return None
+    parts = llm_response.content.parts
+    if any(part.function_call is not None for part in parts):
+        return None
+    text = "".join(part.text or "" for part in parts)
+    return text or None
+
+
+def _answer(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _high_severity(bugs: List[Dict[str, Any]]) -> bool:
+    return any(bug.get("severity") == "high" for bug in bugs)
+
+
+def _trimmed(text: str) -> str:
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return text[:MAX_OUTPUT_CHARS] + f"\n[... {len(text) - MAX_OUTPUT_CHARS} more characters]"
+
+
+def _execution_summary(execution: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of an execution result worth summarizing, without profiles and coverage."""
+    if "result" not in execution:
+        return execution
+    result = execution["result"]
+    return {
+        "status": execution["status"],
+        "stdout": _trimmed(result["stdout"]),
+        "stderr": _trimmed(result["stderr"]),
+        "error": result["error"],
+        "execution_time": result["execution_time"],
+        "runtime_issues": result["runtime_issues"]
+    }
+
+
+def render(results: Dict[str, Any]) -> str:
+    """Markdown report of the fast path results, for when the model is skipped."""
+    bugs = results["analysis"].get("bugs_found", [])
+    lines = []
+    if bugs:
+        lines.append(f"Found {len(bugs)} potential issue(s):")
+        lines.extend(
+            f"- Line {bug.get('line', 0)} ({bug.get('severity', 'medium')}, {bug.get('type', 'bug')}): {bug['description']}"
+            for bug in bugs
+        )
+    else:
+        lines.append("No issues found by static analysis.")
+
+    fixes = results["fixes"].get("fixes", [])
+    if fixes:
+        lines.extend(["", "Suggested fixes:"])
+        for fix in fixes:
+            explanation, _, code = fix.partition("\n")
+            lines.append(f"- {explanation}")
+            if code:
+                lines.extend(["  ```python", *(f"  {line}" for line in code.splitlines()), "  ```"])
+
+    execution = _execution_summary(results["execution"])
+    lines.append("")
+    if execution["status"] == "skipped":
+        lines.append(f"The code was not run: {execution['reason']}")
+    elif execution["status"] == "success":
+        lines.append(f"The code ran successfully in {execution['execution_time']:.3f}s.")
+    else:
+        lines.append(f"The code failed when run: {execution['error']}")
+    if execution.get("stdout"):
+        lines.extend(["", "Output:", "```", execution["stdout"].rstrip("\n"), "```"])
+    runtime_issues = execution.get("runtime_issues", [])
+    if runtime_issues:
+        lines.extend(["", "Runtime issues:"])
+        lines.extend(f"- {issue['description']}" for issue in runtime_issues)
+    return "\n".join(lines)
+
+
+class FastPath:
+    """Model callbacks that answer plain code submissions with the agent's own tools.
+
+    Args:
+        analyze: ``analyze_code``
+        suggest: ``suggest_fixes``
+        execute: ``execute_code``
+        mode: One of ``MODES`` (default: ``BUG_FINDER_FAST_PATH``, or "summarize")
+        cache: Response cache (default: sized by ``BUG_FINDER_RESPONSE_CACHE_SIZE``
+            and ``BUG_FINDER_RESPONSE_CACHE_TTL``)
+    """
+
+    def __init__(
+        self,
+        analyze: Callable[..., Dict[str, Any]],
+        suggest: Callable[..., Dict[str, Any]],
+        execute: Callable[..., Dict[str, Any]],
+        mode: Optional[str] = None,
+        cache: Optional[TTLCache] = None
+    ):
+        if mode is None:
+            mode = os.getenv("BUG_FINDER_FAST_PATH", DEFAULT_MODE)
+        if mode not in MODES:
+            raise ValueError(f"Unknown fast path mode {mode!r}, expected one of {MODES}")
+        if cache is None:
+            cache = TTLCache(
+                int(os.getenv("BUG_FINDER_RESPONSE_CACHE_SIZE", DEFAULT_RESPONSE_CACHE_SIZE)),
+                float(os.getenv("BUG_FINDER_RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL))
+            )
+        self.analyze = analyze
+        self.suggest = suggest
+        self.execute = execute
+        self.mode = mode
+        self.cache = cache
+
+    async def _execution(self, code: str, bugs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Runs the code where safe, as the workflow does."""
+        if _high_severity(bugs):
+            return {"status": "skipped", "reason": "Static analysis found high-severity issues"}
+        try:
+            estimate = await asyncio.wait_for(aio.run_in_pool("analysis", cost.estimate, code), ESTIMATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"status": "skipped", "reason": "The cost of the code could not be estimated in time"}
+        except Exception as e:
+            return {"status": "skipped", "reason": f"The cost of the code could not be estimated: {type(e).__name__}"}
+        admission = cost.admit(estimate, EXECUTION_TIMEOUT)
+        if not admission.run:
+            return {"status": "skipped", "reason": admission.reason}
+        return await aio.run_in_pool("sandbox", self.execute, code, admission.timeout, monitor=monitoring.LOW_OVERHEAD)
+
+    async def results(self, code: str) -> Dict[str, Any]:
+        """Results of the tools the model would call for a code submission."""
+        analysis = await aio.run_in_pool("analysis", self.analyze, code)
+        bugs = analysis.get("bugs_found", [])
+        # Fixes do not depend on the run, so both start at once
+        fixes, execution = await asyncio.gather(
+            aio.run_in_pool("analysis", self.suggest, code, bugs),
+            self._execution(code, bugs)
+        )
+        return {"analysis": analysis, "fixes": fixes, "execution": execution}
+
+    def _summary_request(self, llm_request: LlmRequest, results: Dict[str, Any]) -> None:
+        """Turns ``llm_request`` into a request to summarize ``results``, without tools."""
+        summary = {
+            "bugs_found": results["analysis"].get("bugs_found", []),
+            "fixes": results["fixes"].get("fixes", []),
+            "execution": _execution_summary(results["execution"])
+        }
+        message = llm_request.contents[-1]
+        parts = list(message.parts) + [types.Part(text=f"\n\n{_SUMMARY_REQUEST}\n\n{json.dumps(summary, indent=1)}")]
+        # Earlier turns are left out, so the answer only depends on the cache key
+        llm_request.contents = [types.Content(role="user", parts=parts)]
+        llm_request.config.tools = None
+        llm_request.tools_dict = {}
+
+    async def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        """``before_model_callback``: answers from the cache or runs the tools up front.
+
+        Returns:
+            The answer when it is cached or the model is skipped, otherwise
+            None to let the (possibly rewritten) request reach the model
+        """
+        if self.mode == "off":
+            return None
+        message = _message(llm_request)
+        submission = recognize(message) if message is not None else None
+        if submission is None:
+            return None
+
+        key = cache_key(llm_request.model or "", self.mode, submission)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return _answer(cached)
+
+        try:
+            results = await self.results(submission.code)
+        except Exception:
+            # E.g. code nested too deeply for the analyzers; the model can
+            # still answer with the tools it has
+            return None
+        if self.mode == "direct":
+            text = render(results)
+            self.cache.put(key, text)
+            return _answer(text)
+        self._summary_request(llm_request, results)
+        callback_context.state[_STATE_KEY] = key
+        return None
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        """``after_model_callback``: caches the model's summary of a fast path request."""
+        key = callback_context.state.get(_STATE_KEY)
+        text = _text(llm_response) if key else None
+        if text is not None:
+            self.cache.put(key, text)
+            callback_context.state[_STATE_KEY] = None
+        return None
@@ -0,0 +1,205 @@
+"""Columnar storage for findings.
+
+A ``FindingTable`` keeps findings in parallel arrays instead of one dict per
+issue: interned rule IDs, line numbers and severity codes, plus an interned
+payload with the remaining fields of the issue. Identical payloads, e.g.
+every "Print function found" issue, are stored once, so a row costs a few
+bytes. Convert to the issue dicts the tools return only at the API
+boundary, with ``to_dicts``.
+"""
+
+from array import array
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from bug_finder import engine
+
+# Severity codes; other severities get codes as they are seen
+SEVERITIES = ("low", "medium", "high")
+
+# Payload placeholder for a value kept in the line or severity column
+_IN_COLUMN = object()
+
+Payload = Tuple[Tuple[str, Any], ...]
+
+
+class _Interner:
+    """Maps values to small ints and back."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values: Iterable[Any] = ()):
+        self.values: List[Any] = list(values)
+        self.codes: Dict[Hashable, int] = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value: Any) -> int:
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = self.codes[value] = len(self.values)
+        except TypeError:
+            # Unhashable values are stored, just not shared
+            code = len(self.values)
+        self.values.append(value)
+        return code
+
+
+class FindingTable:
+    """Findings stored in parallel arrays.
+
+    Appending is O(1), counting by severity or rule runs over the arrays,
+    and slicing (``table[10:20]``) returns a read-only view that shares the
+    arrays instead of copying them. The arrays cannot grow while they are
+    shared, so a table cannot be appended to while a slice of it is alive;
+    use ``filter`` for a copy.
+    """
+
+    __slots__ = ("rules", "lines", "severities", "payloads", "_rules", "_severities", "_payloads")
+
+    def __init__(self):
+        self.rules: Union[array, memoryview] = array('H')
+        self.lines: Union[array, memoryview] = array('I')
+        self.severities: Union[array, memoryview] = array('B')
+        self.payloads: Union[array, memoryview] = array('I')
+        self._rules = _Interner()
+        self._severities = _Interner(SEVERITIES)
+        self._payloads = _Interner()
+
+    @classmethod
+    def from_issues(cls, issues: Iterable[Mapping[str, Any]]) -> "FindingTable":
+        table = cls()
+        table.extend_issues(issues)
+        return table
+
+    @classmethod
+    def from_report(cls, report: engine.Report, view: str) -> "FindingTable":
+        """Builds a table from an engine report rendered in one analyzer's vocabulary."""
+        table = cls()
+        formatters = engine.VIEWS[view]
+        for finding in report.findings:
+            formatter = formatters.get(finding.rule)
+            if formatter is not None:
+                table.add_issue(formatter(finding), rule=finding.rule)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def _empty_like(self) -> "FindingTable":
+        table = FindingTable.__new__(FindingTable)
+        table._rules = self._rules
+        table._severities = self._severities
+        table._payloads = self._payloads
+        return table
+
+    def append(self, rule: str, line: int, severity: Optional[str], payload: Payload = ()) -> None:
+        """Adds one finding.
+
+        Args:
+            rule: Rule ID
+            line: Line number, 0 if the finding has none
+            severity: Severity name
+            payload: The (key, value) fields of the issue dict, in order,
+                with ``_IN_COLUMN`` standing in for the line and severity
+        """
+        if isinstance(self.lines, memoryview):
+            raise TypeError("Cannot append to a slice of a FindingTable")
+        try:
+            self.lines.append(line)
+        except BufferError:
+            raise TypeError("Cannot append to a FindingTable while a slice of it is alive") from None
+        # The columns are sliced together, so once lines can grow the others can too
+        self.rules.append(self._rules.code(rule))
+        self.severities.append(self._severities.code(severity))
+        self.payloads.append(self._payloads.code(payload))
+
+    def add_issue(self, issue: Mapping[str, Any], rule: Optional[str] = None) -> None:
+        """Adds an issue dict; its rule ID defaults to its ``rule`` or ``type``."""
+        if rule is None:
+            rule = issue.get("rule") or issue.get("type", "")
+        line = issue.get("line")
+        if not isinstance(line, int) or isinstance(line, bool) or line < 0:
+            line = None
+        payload = tuple(
+            (key, _IN_COLUMN if key == "severity" or (key == "line" and line is not None) else value)
+            for key, value in issue.items()
+        )
+        self.append(rule, line or 0, issue.get("severity"), payload)
+
+    def extend_issues(self, issues: Iterable[Mapping[str, Any]]) -> None:
+        for issue in issues:
+            self.add_issue(issue)
+
+    def severity_counts(self) -> Dict[str, int]:
+        """Number of findings per severity; the standard severities are always present."""
+        data = self.severities.tobytes()
+        counts = {name: 0 for name in SEVERITIES}
+        for code, name in enumerate(self._severities.values):
+            count = data.count(code.to_bytes(1, 'little'))
+            if count or name in counts:
+                counts[name] = count
+        return counts
+
+    def rule_counts(self) -> Dict[str, int]:
+        """Number of findings per rule ID."""
+        names = self._rules.values
+        return {names[code]: count for code, count in Counter(self.rules).items()}
+
+    def count(self, severity: str) -> int:
+        """Number of findings with the given severity."""
+        code = self._severities.codes.get(severity)
+        if code is None:
+            return 0
+        return self.severities.tobytes().count(code.to_bytes(1, 'little'))
+
+    def filter(self, severity: Optional[str] = None, rule: Optional[str] = None) -> "FindingTable":
+        """Returns a new table with the findings of the given severity and/or rule."""
+        selected = range(len(self))
+        if severity is not None:
+            code = self._severities.codes.get(severity)
+            severities = self.severities
+            selected = [i for i in selected if severities[i] == code]
+        if rule is not None:
+            code = self._rules.codes.get(rule)
+            rules = self.rules
+            selected = [i for i in selected if rules[i] == code]
+
+        table = self._empty_like()
+        table.rules = array('H', (self.rules[i] for i in selected))
+        table.lines = array('I', (self.lines[i] for i in selected))
+        table.severities = array('B', (self.severities[i] for i in selected))
+        table.payloads = array('I', (self.payloads[i] for i in selected))
+        return table
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Converts one finding back to its issue dict."""
+        line = self.lines[index]
+        severity = self._severities.values[self.severities[index]]
+        issue = {}
+        for key, value in self._payloads.values[self.payloads[index]]:
+            if value is _IN_COLUMN:
+                value = line if key == "line" else severity
+            issue[key] = value
+        return issue
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, int):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("FindingTable index out of range")
+            return self.row(index)
+        table = self._empty_like()
+        table.rules = memoryview(self.rules)[index]
+        table.lines = memoryview(self.lines)[index]
+        table.severities = memoryview(self.severities)[index]
+        table.payloads = memoryview(self.payloads)[index]
+        return table
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Converts every finding back to its issue dict."""
+        return list(self)
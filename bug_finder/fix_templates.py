@@ -0,0 +1,179 @@
+"""Fix templates indexed by rule ID, shared by both ``suggest_fixes`` tools.
+
+Every finding carries the stable ID of the rule that produced it in its
+``rule`` key. A template registered for that ID explains the fix and, where
+the fix can be written mechanically, generates the corrected line from the
+original one; its patterns are compiled once, when it is registered.
+``suggest`` looks each finding's template up in a dict and splits the source
+once per batch, so a batch of findings costs time linear in its size.
+"""
+
+import ast
+import re
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from bug_finder import profiling
+
+# Generates the fixed code for an issue from its original line, or None
+# when the fix cannot be written mechanically
+FixFunc = Callable[[str, Dict[str, Any]], Optional[str]]
+
+
+class FixTemplate(NamedTuple):
+    """A registered fix and what it explains."""
+    rule: str
+    # Issue type reported on the fix
+    issue_type: str
+    explanation: str
+    generate: Optional[FixFunc] = None
+
+
+class Suggestion(NamedTuple):
+    """A fix for one issue."""
+    rule: str
+    issue_type: str
+    line: int
+    original_code: str
+    # None when the template only explains the fix
+    suggested_fix: Optional[str]
+    explanation: str
+
+
+FIXES: Dict[str, FixTemplate] = {}
+
+
+def fix(rule: str, issue_type: str, explanation: str) -> Callable[[FixFunc], FixFunc]:
+    """Registers a fix generator for ``rule``."""
+    def register(func: FixFunc) -> FixFunc:
+        FIXES[rule] = FixTemplate(rule, issue_type, explanation, func)
+        return func
+    return register
+
+
+def explain(rule: str, issue_type: str, explanation: str) -> None:
+    """Registers a fix for ``rule`` that is explained but not generated."""
+    FIXES[rule] = FixTemplate(rule, issue_type, explanation)
+
+
+def rule_of(issue: Dict[str, Any]) -> str:
+    """Rule ID of an issue; issues from older callers fall back to their kind or type."""
+    return issue.get('rule') or issue.get('kind') or issue.get('type', '')
+
+
+def _call(line: str, name: str) -> Optional[ast.Call]:
+    """The call to ``name`` that makes up the whole statement on ``line``, if any."""
+    try:
+        tree = ast.parse(line.strip())
+    except SyntaxError:
+        return None
+    if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+        call = tree.body[0].value
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == name:
+            return call
+    return None
+
+
+_BARE_EXCEPT = re.compile(r"\bexcept\s*:")
+_ASSIGNED_NAME = re.compile(r"^\s*([A-Za-z_]\w*)\s*=")
+# A call of the builtin, not of a method such as ``obj.eval(``
+_EVAL_CALL = re.compile(r"(?<![\w.])eval\s*\(")
+# ``is`` followed by a number or string literal, where == is meant; ``is
+# None`` is left alone, and ``is True``/``is False`` become truth tests
+# rather than ==
+_IS_NOT_LITERAL = re.compile(r"\bis\s+not\s+(?=[-+]?\.?\d|[rRbBuU]{0,2}['\"])")
+_IS_LITERAL = re.compile(r"\bis\s+(?=[-+]?\.?\d|[rRbBuU]{0,2}['\"])")
+
+
+@fix("bare_except", "logical", "Specify the exceptions you want to catch instead of using a bare except")
+def _fix_bare_except(line: str, issue: Dict[str, Any]) -> Optional[str]:
+    fixed = _BARE_EXCEPT.sub("except (ValueError, TypeError):", line, count=1)
+    return fixed if fixed != line else None
+
+
+@fix(
+    "hardcoded_secret", "security",
+    "Use environment variables for sensitive data instead of hardcoding (requires 'import os')"
+)
+def _fix_hardcoded_secret(line: str, issue: Dict[str, Any]) -> Optional[str]:
+    match = _ASSIGNED_NAME.match(line)
+    name = match.group(1) if match else "secret"
+    return f'{name} = os.getenv("{name.upper()}")'
+
+
+@fix(
+    "code_execution", "security",
+    "Avoid eval() and exec(). Use ast.literal_eval() to parse literals (requires 'import ast'), "
+    "or validate the input explicitly"
+)
+def _fix_code_execution(line: str, issue: Dict[str, Any]) -> Optional[str]:
+    fixed = _EVAL_CALL.sub("ast.literal_eval(", line, count=1)
+    return fixed if fixed != line else None
+
+
+@fix("print_call", "style", "Use logging instead of print statements in production code (requires 'import logging')")
+def _fix_print_call(line: str, issue: Dict[str, Any]) -> Optional[str]:
+    call = _call(line, "print")
+    if call is None or call.keywords:
+        return None
+    source = line.strip()
+    args = [ast.get_source_segment(source, arg) for arg in call.args]
+    if len(args) == 1:
+        return f"logging.info({args[0]})"
+    placeholders = " ".join(["%s"] * len(args))
+    return f'logging.info("{placeholders}"{"".join(", " + arg for arg in args)})'
+
+
+@fix(
+    "literal_comparison", "style",
+    "Use == to compare with a number or string; keep 'is' for None, and test True/False by truth value"
+)
+def _fix_literal_comparison(line: str, issue: Dict[str, Any]) -> Optional[str]:
+    fixed = _IS_LITERAL.sub("== ", _IS_NOT_LITERAL.sub("!= ", line))
+    return fixed if fixed != line else None
+
+
+explain("syntax_error", "syntax", "Fix the syntax error")
+explain("missing_argument", "logical", "Pass every required argument, or give the parameter a default value")
+explain("signature_mismatch", "logical", "Match the call to the signature of the function it calls")
+explain("timeout", "runtime", "Make sure every loop terminates and reduce the work done per run")
+explain("execution_error", "runtime", "Handle the error, or fix the input that causes it")
+explain("runtime_error", "runtime", "Handle the error, or fix the input that causes it")
+explain("resource_usage", "runtime", "Reduce the CPU time, memory or output the code uses")
+explain("unbounded", "performance", "Add a break, return or exit condition so that the loop or recursion ends")
+explain("swallowed_exception", "logical", "Catch only the exceptions you expect, and handle or log them instead of ignoring them")
+explain("loop_budget", "performance", "Bound the loop, or replace it with a built-in or a closed-form computation")
+for kind, hint in profiling.OPTIMIZATION_HINTS.items():
+    explain(kind, "performance", hint)
+
+
+def suggest(code: str, issues: Iterable[Dict[str, Any]]) -> List[Suggestion]:
+    """Suggests a fix for every issue whose rule has a template.
+
+    Args:
+        code: The source the issues were found in
+        issues: Issue dicts with a ``rule`` (or ``kind``/``type``) and ``line``
+
+    Returns:
+        One suggestion per issue with a template, in the order of
+        ``issues``; issues without a line in ``code`` get an empty
+        ``original_code`` and no ``suggested_fix``, and the explanation of
+        a suggestion without a fix ends with the issue's description
+    """
+    lines = code.split('\n')
+    suggestions = []
+    for issue in issues:
+        template = FIXES.get(rule_of(issue))
+        if template is None:
+            continue
+        line = issue.get('line', 0) or 0
+        original = lines[line - 1] if 0 < line <= len(lines) else ""
+        generated = template.generate(original, issue) if template.generate and original else None
+        explanation = template.explanation
+        if generated is None and issue.get('description'):
+            # Without code to show, the explanation has to say what was found
+            explanation = f"{explanation} - {issue['description']}"
+        suggestions.append(Suggestion(
+            template.rule, template.issue_type, line, original,
+            generated.strip() if generated is not None else None, explanation
+        ))
+    return suggestions
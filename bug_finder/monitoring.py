@@ -0,0 +1,305 @@
+"""Line coverage, swallowed exceptions and long loops of executed snippets.
+
+Used by the sandbox when ``execute_code`` runs with ``monitor=True``. On
+Python 3.12 and later the events come from ``sys.monitoring`` (PEP 669),
+only for the snippet's own code objects: each line reports itself once and
+each loop until it reaches ``LOOP_BUDGET``, and is then disabled, so a
+monitored run costs little more than a plain one. Older versions fall back
+to ``sys.settrace``, which reports the same things more slowly.
+"""
+
+import ast
+import dis
+import sys
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# Iterations after which a loop is reported
+LOOP_BUDGET = 100_000
+
+TOOL_NAME = "bug_finder"
+
+_MONITORING = getattr(sys, "monitoring", None)
+
+# Whether monitoring is cheap enough to turn on for every run
+LOW_OVERHEAD = _MONITORING is not None
+
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+
+
+def _code_objects(code: Any) -> Iterator[Any]:
+    """``code`` and every code object nested in it."""
+    yield code
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            yield from _code_objects(const)
+
+
+def _line_starts(code: Any) -> Tuple[List[int], List[int]]:
+    starts = [(offset, line) for offset, line in dis.findlinestarts(code) if line]
+    return [offset for offset, _ in starts], [line for _, line in starts]
+
+
+def _handler_names(handler: ast.ExceptHandler) -> Set[str]:
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return {
+        node.attr if isinstance(node, ast.Attribute) else getattr(node, "id", "")
+        for node in types
+    }
+
+
+class _Source:
+    """Maps the lines where events happen to the loops and handlers around them."""
+
+    def __init__(self, source: str):
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            tree = ast.Module(body=[], type_ignores=[])
+        self.loops = []
+        self.tries = []
+        for node in ast.walk(tree):
+            if isinstance(node, _LOOPS):
+                self.loops.append(node)
+            elif isinstance(node, ast.Try) or type(node).__name__ == "TryStar":
+                self.tries.append(node)
+
+    def loop_line(self, line: int) -> int:
+        """Line of the innermost loop containing ``line``."""
+        inner = None
+        for loop in self.loops:
+            if loop.lineno <= line <= loop.end_lineno and (inner is None or loop.lineno > inner.lineno):
+                inner = loop
+        return inner.lineno if inner is not None else line
+
+    def handler_line(self, line: int, exception: BaseException) -> Optional[int]:
+        """Line of the ``except`` clause that catches ``exception`` raised at ``line``."""
+        inner = None
+        for node in self.tries:
+            if node.body[0].lineno <= line <= node.body[-1].end_lineno and node.handlers:
+                if inner is None or node.lineno > inner.lineno:
+                    inner = node
+        if inner is None:
+            return None
+        names = {cls.__name__ for cls in type(exception).__mro__}
+        for handler in inner.handlers:
+            if handler.type is None or names & _handler_names(handler):
+                return handler.lineno
+        return inner.handlers[0].lineno
+
+
+class Monitor:
+    """Runs a compiled snippet while recording coverage, handled exceptions and loops."""
+
+    def __init__(self, source: str, loop_budget: int = LOOP_BUDGET):
+        self.source = _Source(source)
+        self.loop_budget = loop_budget
+        self.backend = "sys.monitoring" if _MONITORING is not None else "settrace"
+        self.executable: Set[int] = set()
+        self.lines: Set[int] = set()
+        # Loop iterations, keyed by the line iterations jump back to
+        self.iterations: Dict[Any, int] = {}
+        self.long_loops: Set[int] = set()
+        # id of a handled exception -> (exception, line it was raised at)
+        self.handled: Dict[int, Tuple[BaseException, int]] = {}
+        self._last_raise: Dict[int, Tuple[Any, int]] = {}
+        self._codes: Set[Any] = set()
+        self._line_starts: Dict[Any, Tuple[List[int], List[int]]] = {}
+
+    def run(self, compiled_code: Any, namespace: Dict[str, Any]) -> None:
+        for code in _code_objects(compiled_code):
+            self._codes.add(code)
+            self._line_starts[code] = starts = _line_starts(code)
+            self.executable.update(starts[1])
+        try:
+            if _MONITORING is not None:
+                self._run_monitored(compiled_code, namespace)
+            else:
+                self._run_traced(compiled_code, namespace)
+        except BaseException as e:
+            # Exceptions that escaped were not swallowed
+            self.handled.pop(id(e), None)
+            raise
+
+    def _line(self, code: Any, offset: int) -> int:
+        offsets, lines = self._line_starts[code]
+        index = bisect_right(offsets, offset) - 1
+        return lines[index] if index >= 0 else 0
+
+    def _count_iteration(self, key: Any, line: int) -> bool:
+        """Counts a loop iteration; True once the loop is over budget."""
+        count = self.iterations.get(key, 0) + 1
+        self.iterations[key] = count
+        if count == self.loop_budget:
+            self.long_loops.add(self.source.loop_line(line))
+        return count >= self.loop_budget
+
+    def _raised(self, code: Any, line: int, exception: BaseException) -> None:
+        # Re-raised or converted into another exception: not swallowed
+        self.handled.pop(id(exception), None)
+        if exception.__context__ is not None:
+            self.handled.pop(id(exception.__context__), None)
+        self._last_raise[id(exception)] = (code, line)
+
+    def _caught(self, code: Any, exception: BaseException) -> None:
+        raised_in, line = self._last_raise.get(id(exception), (None, 0))
+        if raised_in is code:
+            self.handled[id(exception)] = (exception, line)
+
+    # sys.monitoring backend
+
+    def _run_monitored(self, compiled_code: Any, namespace: Dict[str, Any]) -> None:
+        monitoring = _MONITORING
+        events = monitoring.events
+        tool = next(tool for tool in range(6) if monitoring.get_tool(tool) is None)
+        monitoring.use_tool_id(tool, TOOL_NAME)
+        callbacks = {
+            events.LINE: self._on_line,
+            events.JUMP: self._on_jump,
+            events.RAISE: self._on_raise,
+            events.RERAISE: self._on_raise,
+            events.EXCEPTION_HANDLED: self._on_handled,
+        }
+        try:
+            for event, callback in callbacks.items():
+                monitoring.register_callback(tool, event, callback)
+            for code in self._codes:
+                monitoring.set_local_events(tool, code, events.LINE | events.JUMP)
+            monitoring.set_events(tool, events.RAISE | events.RERAISE | events.EXCEPTION_HANDLED)
+            # Locations disabled by an earlier run of the same code objects
+            monitoring.restart_events()
+            exec(compiled_code, namespace)
+        finally:
+            monitoring.set_events(tool, 0)
+            for code in self._codes:
+                monitoring.set_local_events(tool, code, 0)
+            for event in callbacks:
+                monitoring.register_callback(tool, event, None)
+            monitoring.free_tool_id(tool)
+
+    def _on_line(self, code: Any, line: int) -> Any:
+        self.lines.add(line)
+        return _MONITORING.DISABLE
+
+    def _on_jump(self, code: Any, offset: int, destination: int) -> Any:
+        if destination >= offset:
+            return _MONITORING.DISABLE
+        if self._count_iteration((code, destination), self._line(code, destination)):
+            return _MONITORING.DISABLE
+        return None
+
+    def _on_raise(self, code: Any, offset: int, exception: BaseException) -> None:
+        if code in self._codes:
+            self._raised(code, self._line(code, offset), exception)
+
+    def _on_handled(self, code: Any, offset: int, exception: BaseException) -> None:
+        if code in self._codes:
+            self._caught(code, exception)
+
+    # sys.settrace backend
+
+    def _run_traced(self, compiled_code: Any, namespace: Dict[str, Any]) -> None:
+        previous_lines: Dict[Any, int] = {}
+        pending: Dict[Any, BaseException] = {}
+
+        def trace_lines(frame: Any, event: str, arg: Any) -> Any:
+            line = frame.f_lineno
+            if event == 'line':
+                self.lines.add(line)
+                if frame in pending:
+                    self._caught(frame.f_code, pending.pop(frame))
+                previous = previous_lines.get(frame)
+                if previous is not None and line <= previous:
+                    self._count_iteration((frame.f_code, line), line)
+                previous_lines[frame] = line
+            elif event == 'exception':
+                exception = arg[1]
+                self._raised(frame.f_code, line, exception)
+                pending[frame] = exception
+            elif event == 'return':
+                previous_lines.pop(frame, None)
+                pending.pop(frame, None)
+            return trace_lines
+
+        def trace_calls(frame: Any, event: str, arg: Any) -> Any:
+            if frame.f_code in self._codes:
+                return trace_lines(frame, event, arg)
+            return None
+
+        sys.settrace(trace_calls)
+        try:
+            exec(compiled_code, namespace)
+        finally:
+            sys.settrace(None)
+
+    def results(self) -> Dict[str, Any]:
+        """Coverage, swallowed exceptions and long loops of the run."""
+        swallowed: Dict[Tuple[Optional[int], int, str], int] = {}
+        for exception, line in self.handled.values():
+            key = (self.source.handler_line(line, exception), line, type(exception).__name__)
+            swallowed[key] = swallowed.get(key, 0) + 1
+        executable = sorted(self.executable)
+        return {
+            "backend": self.backend,
+            "covered_lines": sorted(self.lines & self.executable),
+            "uncovered_lines": sorted(self.executable - self.lines),
+            "coverage": len(self.lines & self.executable) / len(executable) if executable else 1.0,
+            "swallowed_exceptions": [
+                {"handler_line": handler, "line": line, "exception": name, "count": count}
+                for (handler, line, name), count in sorted(swallowed.items(), key=lambda item: item[0][1])
+            ],
+            "long_loops": [
+                {"line": line, "iterations": self.loop_budget}
+                for line in sorted(self.long_loops)
+            ]
+        }
+
+
+def monitoring_issues(monitor: Dict[str, Any], flagged: Dict[int, str]) -> List[Dict[str, Any]]:
+    """Turns a monitored run into runtime issues.
+
+    Args:
+        monitor: The ``Monitor.results`` of the run
+        flagged: Rule names of the static findings, by line
+
+    Returns:
+        Issues for swallowed exceptions (high severity when the handler is
+        a bare except flagged by static analysis), loops over the budget,
+        and flagged lines the run never reached
+    """
+    if not monitor:
+        return []
+    issues = []
+    for entry in monitor["swallowed_exceptions"]:
+        handler = entry["handler_line"]
+        bare = flagged.get(handler) == "bare_except"
+        where = f"the bare except at line {handler}" if bare else (
+            f"the except clause at line {handler}" if handler else "a handler"
+        )
+        times = f" ({entry['count']} times)" if entry["count"] > 1 else ""
+        issues.append({
+            "type": "swallowed_exception",
+            "rule": "swallowed_exception",
+            "line": handler or entry["line"],
+            "description": f"{entry['exception']} raised at line {entry['line']} was swallowed by {where}{times}",
+            "severity": "high" if bare else "medium"
+        })
+    for entry in monitor["long_loops"]:
+        issues.append({
+            "type": "loop_budget",
+            "rule": "loop_budget",
+            "line": entry["line"],
+            "description": f"Loop at line {entry['line']} ran more than {entry['iterations']:,} iterations",
+            "severity": "medium"
+        })
+    uncovered = set(monitor["uncovered_lines"])
+    for line in sorted(flagged):
+        if line in uncovered:
+            issues.append({
+                "type": "coverage",
+                "rule": "coverage",
+                "line": line,
+                "description": f"Line {line}, flagged by static analysis ({flagged[line]}), never ran",
+                "severity": "low"
+            })
+    return issues
@@ -0,0 +1,247 @@
+"""Applies many line-based fixes to a source in one pass.
+
+A fix replaces lines ``line`` to ``end_line`` (inclusive) of the original
+source with ``suggested_fix``, which may span several lines or be empty to
+delete them. Line numbers always refer to the original source, so fixes
+never need renumbering after an earlier fix changes the line count.
+Replacements are re-indented to the indentation of the first line they
+replace and keep its line endings.
+
+Fixes whose line ranges overlap conflict, unless they make the same
+change; of two conflicting fixes the one given first is applied. A fix
+whose ``original_code`` no longer matches the source conflicts as well.
+"""
+
+import textwrap
+from bisect import bisect_left
+from typing import Any, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from bug_finder.engine import split_lines
+
+# Unchanged lines shown around each change in the diff
+DIFF_CONTEXT = 3
+
+
+class Edit(NamedTuple):
+    """A fix as a replacement of original lines ``start`` to ``end``."""
+    start: int
+    end: int
+    # Replacement lines, with line endings
+    lines: Tuple[str, ...]
+    # Position of the fix in the list it came from
+    index: int
+
+
+class Conflict(NamedTuple):
+    index: int
+    line: int
+    reason: str
+
+
+class Patch(NamedTuple):
+    code: str
+    diff: str
+    applied: Tuple[int, ...]
+    conflicts: Tuple[Conflict, ...]
+
+
+def fix_field(fix: Any, name: str, default: Any = None) -> Any:
+    """Field of a ``CodeFix`` or of a fix dict."""
+    if isinstance(fix, dict):
+        return fix.get(name, default)
+    return getattr(fix, name, default)
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip(' \t'))]
+
+
+def _ending(line: str) -> str:
+    return line[len(line.rstrip('\r\n')):]
+
+
+def _replacement(text: str, first: str, last: str) -> Tuple[str, ...]:
+    """Lines of ``text`` re-indented like ``first``, ending like ``last``.
+
+    Text that is empty or only whitespace deletes the lines it replaces.
+    """
+    if not text.strip():
+        return ()
+    indent = _indent(first)
+    ending = _ending(last) or _ending(first) or '\n'
+    lines = textwrap.dedent(text).strip('\r\n').splitlines()
+    replaced = tuple(indent + line + ending if line.strip() else ending for line in lines)
+    if replaced and not _ending(last):
+        # The last line of the source has no line ending
+        replaced = replaced[:-1] + (replaced[-1].rstrip('\r\n'),)
+    return replaced
+
+
+def _matches(original: str, lines: List[str]) -> bool:
+    """Whether ``original`` is the text of ``lines``, ignoring indentation and endings."""
+    expected = [line.strip() for line in original.strip('\r\n').splitlines()]
+    return expected == [line.strip() for line in lines]
+
+
+def check(lines: List[str], fix: Any) -> Optional[str]:
+    """Why ``fix`` cannot be applied to ``lines`` even on its own, or None."""
+    start = fix_field(fix, 'line', 0)
+    end = fix_field(fix, 'end_line', 0) or start
+    if not 0 < start <= end <= len(lines):
+        return "Invalid line number"
+    original = fix_field(fix, 'original_code', '')
+    if original and not _matches(original, lines[start - 1:end]):
+        return "The original code no longer matches the source"
+    return None
+
+
+def _edits(lines: List[str], fixes: List[Any], indexes: Sequence[int]) -> Tuple[List[Edit], List[Conflict]]:
+    """Validates the fixes and sorts them by position, dropping conflicts."""
+    edits: List[Edit] = []
+    starts: List[int] = []
+    conflicts = []
+    for index, fix in zip(indexes, fixes):
+        start = fix_field(fix, 'line', 0)
+        end = fix_field(fix, 'end_line', 0) or start
+        reason = check(lines, fix)
+        if reason is not None:
+            conflicts.append(Conflict(index, start, reason))
+            continue
+        edit = Edit(start, end, _replacement(fix_field(fix, 'suggested_fix', ''), lines[start - 1], lines[end - 1]), index)
+
+        # Accepted edits never overlap, so only the neighbours can
+        position = bisect_left(starts, start)
+        neighbours = edits[max(0, position - 1):position + 1]
+        overlapping = [other for other in neighbours if other.start <= end and start <= other.end]
+        if overlapping:
+            other = overlapping[0]
+            if (other.start, other.end, other.lines) != (start, end, edit.lines):
+                conflicts.append(Conflict(index, start, f"Overlaps fix {other.index}"))
+            # The same change twice is applied once
+            continue
+        edits.insert(position, edit)
+        starts.insert(position, start)
+    return edits, conflicts
+
+
+def _hunks(edits: List[Edit]) -> Iterator[List[Edit]]:
+    """Groups edits whose diff context touches."""
+    group: List[Edit] = []
+    for edit in edits:
+        if group and edit.start - group[-1].end - 1 > 2 * DIFF_CONTEXT:
+            yield group
+            group = []
+        group.append(edit)
+    if group:
+        yield group
+
+
+def _trim(edit: Edit, lines: List[str]) -> Edit:
+    """Drops replacement lines at either end that equal the lines they replace."""
+    start, end, replacement = edit.start, edit.end, edit.lines
+    while start <= end and replacement and replacement[0] == lines[start - 1]:
+        start, replacement = start + 1, replacement[1:]
+    while start <= end and replacement and replacement[-1] == lines[end - 1]:
+        end, replacement = end - 1, replacement[:-1]
+    return edit._replace(start=start, end=end, lines=replacement)
+
+
+def _diff_line(prefix: str, line: str) -> str:
+    if line.endswith(('\n', '\r')):
+        return prefix + line
+    return prefix + line + '\n\\ No newline at end of file\n'
+
+
+def _range(start: int, count: int) -> str:
+    # An empty range is numbered by the line before it
+    if count == 0:
+        return f"{start - 1},0"
+    return f"{start}" if count == 1 else f"{start},{count}"
+
+
+def unified_diff(lines: List[str], edits: List[Edit], filename: str = "code.py") -> str:
+    """Unified diff of sorted, non-overlapping ``edits`` to ``lines``.
+
+    An edit with ``end`` before ``start`` inserts its lines before line
+    ``start``.
+
+    Built from the edits directly, so its cost follows the size of the
+    changes rather than of the source.
+    """
+    if not edits:
+        return ""
+    out = [f"--- a/{filename}\n", f"+++ b/{filename}\n"]
+    delta = 0
+    for group in _hunks(edits):
+        old_start = max(1, group[0].start - DIFF_CONTEXT)
+        old_end = min(len(lines), group[-1].end + DIFF_CONTEXT)
+        body = []
+        position = old_start
+        group_delta = 0
+        for edit in group:
+            body.extend(_diff_line(' ', line) for line in lines[position - 1:edit.start - 1])
+            body.extend(_diff_line('-', line) for line in lines[edit.start - 1:edit.end])
+            body.extend(_diff_line('+', line) for line in edit.lines)
+            group_delta += len(edit.lines) - (edit.end - edit.start + 1)
+            position = edit.end + 1
+        body.extend(_diff_line(' ', line) for line in lines[position - 1:old_end])
+        old_count = old_end - old_start + 1
+        out.append(
+            f"@@ -{_range(old_start, old_count)} "
+            f"+{_range(old_start + delta, old_count + group_delta)} @@\n"
+        )
+        out.extend(body)
+        delta += group_delta
+    return ''.join(out)
+
+
+def source_lines(code: str) -> List[str]:
+    """Lines of ``code`` as fixes number them, with line endings."""
+    lines = split_lines(code)
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def apply(
+    code: str,
+    fixes: List[Any],
+    filename: str = "code.py",
+    indexes: Optional[Sequence[int]] = None
+) -> Patch:
+    """Applies ``fixes`` to ``code`` in a single pass.
+
+    Args:
+        code: The original source
+        fixes: ``CodeFix`` objects or dicts with ``line``, optional
+            ``end_line``, ``suggested_fix`` and optional ``original_code``
+        filename: Name used in the diff headers
+        indexes: Numbers the fixes are reported by, e.g. their positions
+            in a longer list (default: their positions in ``fixes``)
+
+    Returns:
+        The patched code, its unified diff, the indexes of the fixes that
+        were applied and the conflicts of those that were not
+    """
+    lines = source_lines(code)
+    if indexes is None:
+        indexes = range(len(fixes))
+    edits, conflicts = _edits(lines, fixes, indexes)
+    # Unchanged lines at the edges of a fix stay out of the diff
+    edits = [edit for edit in (_trim(edit, lines) for edit in edits) if edit.lines or edit.start <= edit.end]
+
+    out: List[str] = []
+    position = 1
+    for edit in edits:
+        out.extend(lines[position - 1:edit.start - 1])
+        out.extend(edit.lines)
+        position = edit.end + 1
+    out.extend(lines[position - 1:])
+
+    conflicting = {conflict.index for conflict in conflicts}
+    return Patch(
+        ''.join(out),
+        unified_diff(lines, edits, filename),
+        tuple(index for index in indexes if index not in conflicting),
+        tuple(conflicts)
+    )
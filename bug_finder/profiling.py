@@ -0,0 +1,196 @@
+"""Function, line and allocation profiles of executed snippets.
+
+Used by the sandbox when ``execute_code`` runs with ``profile=True``. Only
+code compiled from the snippet (filename ``<string>``) is profiled, so the
+hot spots name lines of the user's code.
+"""
+
+import cProfile
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List
+
+SNIPPET_FILENAME = '<string>'
+
+# Entries reported per profile section
+PROFILE_TOP = 3
+
+# Lines and functions below this share of the run time, or below this
+# many seconds, are not reported
+MIN_TIME_SHARE = 0.1
+MIN_SECONDS = 0.01
+
+# Seconds of CPU time between two samples of the running lines
+SAMPLE_INTERVAL = 0.001
+
+# CPU-time limit of a profiled run, as a multiple of the run's limit:
+# tracemalloc alone makes allocation-heavy code about ten times slower
+PROFILED_CPU_FACTOR = 10
+
+# Allocation sites below this size are not reported
+MIN_ALLOCATION_BYTES = 64 * 1024
+
+# Optimization suggestions for each kind of performance issue
+OPTIMIZATION_HINTS = {
+    "slow_line": "Hot line: move loop-invariant work out of the loop, or use a built-in such as sum() or a comprehension",
+    "slow_function": "Hot function: cache repeated results (functools.lru_cache) or reduce the number of calls",
+    "allocation": "Large allocation: process the data incrementally with a generator instead of building it all in memory",
+}
+
+
+class _LineSampler:
+    """Share of the samples in which each line of the snippet was running.
+
+    Samples the stack about every ``SAMPLE_INTERVAL`` seconds of CPU time
+    (``SIGPROF``) instead of tracing every line, which would slow the run
+    down many times over; a line counts while it runs and while the calls
+    it makes run. Sampling needs ``signal.setitimer`` and the main thread;
+    elsewhere no line times are recorded.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._code = None
+        self._previous_handler = None
+
+    def _sample(self, signum: int, frame: Any) -> None:
+        lines = set()
+        while frame is not None:
+            if frame.f_code.co_filename == SNIPPET_FILENAME:
+                lines.add(frame.f_lineno)
+            if frame.f_code is self._code:
+                # Frames further out run the sandbox, not the snippet
+                self.samples.update(lines)
+                self.total += 1
+                return
+            frame = frame.f_back
+
+    def start(self, code: Any) -> None:
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            return
+        self._code = code
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        if self._previous_handler is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler)
+        self._previous_handler = None
+
+
+class Profiler:
+    """Runs a compiled snippet under cProfile, a line sampler and tracemalloc.
+
+    cProfile and tracemalloc still slow the run down, so its times are
+    those of the instrumented run, not of a plain one.
+    """
+
+    def __init__(self):
+        self.functions = cProfile.Profile()
+        self.lines = _LineSampler()
+        self.snapshot = None
+        self.total_time = 0.0
+
+    def run(self, compiled_code: Any, namespace: Dict[str, Any]) -> None:
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        self.lines.start(compiled_code)
+        self.functions.enable()
+        try:
+            exec(compiled_code, namespace)
+        finally:
+            self.functions.disable()
+            self.lines.stop()
+            self.total_time = time.perf_counter() - start_time
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def results(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The top functions, lines and allocation sites of the run."""
+        functions = []
+        for (filename, line, name), (_, calls, _, cumulative, _) in pstats.Stats(self.functions).stats.items():
+            if filename == SNIPPET_FILENAME and name != '<module>':
+                functions.append({"name": name, "line": line, "calls": calls, "seconds": cumulative})
+        functions.sort(key=lambda entry: entry["seconds"], reverse=True)
+
+        # The timer ticks less often than asked on some systems, so line
+        # times are shares of the run time rather than counts of intervals
+        lines = [
+            {"line": line, "samples": samples, "seconds": self.total_time * samples / self.lines.total}
+            for line, samples in self.lines.samples.items()
+        ]
+        lines.sort(key=lambda entry: entry["seconds"], reverse=True)
+
+        allocations = []
+        if self.snapshot is not None:
+            snapshot = self.snapshot.filter_traces([tracemalloc.Filter(True, SNIPPET_FILENAME)])
+            for statistic in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                allocations.append({
+                    "line": statistic.traceback[0].lineno,
+                    "bytes": statistic.size,
+                    "blocks": statistic.count
+                })
+
+        return {
+            "total_seconds": self.total_time,
+            "functions": functions[:PROFILE_TOP],
+            "lines": lines[:PROFILE_TOP],
+            "allocations": allocations
+        }
+
+
+def performance_issues(profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turns a profile into ``performance`` runtime issues naming its hot spots."""
+    issues = []
+    total = profile.get("total_seconds") or 0.0
+    if total > 0:
+        for entry in profile.get("lines", []):
+            share = entry["seconds"] / total
+            if share >= MIN_TIME_SHARE and entry["seconds"] >= MIN_SECONDS:
+                issues.append({
+                    "type": "performance",
+                    "kind": "slow_line",
+                    "rule": "slow_line",
+                    "line": entry["line"],
+                    "description": (
+                        f"Line {entry['line']} took about {entry['seconds']:.3f}s under the profiler "
+                        f"({share:.0%} of the profiled run, {entry['samples']} samples)"
+                    ),
+                    "severity": "medium" if share >= 0.5 else "low"
+                })
+        for entry in profile.get("functions", []):
+            share = entry["seconds"] / total
+            if share >= MIN_TIME_SHARE and entry["seconds"] >= MIN_SECONDS:
+                issues.append({
+                    "type": "performance",
+                    "kind": "slow_function",
+                    "rule": "slow_function",
+                    "line": entry["line"],
+                    "description": (
+                        f"Function {entry['name']} took {entry['seconds']:.3f}s under the profiler "
+                        f"({share:.0%} of the profiled run, {entry['calls']} calls)"
+                    ),
+                    "severity": "medium" if share >= 0.5 else "low"
+                })
+    for entry in profile.get("allocations", []):
+        if entry["bytes"] >= MIN_ALLOCATION_BYTES:
+            issues.append({
+                "type": "performance",
+                "kind": "allocation",
+                "rule": "allocation",
+                "line": entry["line"],
+                "description": (
+                    f"Line {entry['line']} holds {entry['bytes'] / (1024 * 1024):.1f}MB "
+                    f"in {entry['blocks']} blocks"
+                ),
+                "severity": "low"
+            })
+    return issues
@@ -0,0 +1,1109 @@
+"""Pool of pre-started worker processes that run untrusted snippets.
+
+Every snippet runs in a separate worker process under a hard wall-clock
+timeout, so a ``while True`` cannot hang the agent server. A worker that
+overruns is killed and replaced; healthy workers are reused, so a run costs
+a pipe round trip instead of interpreter start-up. Workers import the
+allowed modules before taking their first job.
+
+Each run is also held to CPU-time, memory and output-size ``Limits`` and
+reports the resources it used.
+"""
+
+import ast
+import atexit
+import builtins
+import concurrent.futures
+import contextlib
+import heapq
+import importlib
+import importlib.util
+import itertools
+import marshal
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import deque
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from bug_finder import aio, cost
+from bug_finder.cache import LRUCache, content_hash
+from bug_finder.monitoring import Monitor
+from bug_finder.profiling import PROFILED_CPU_FACTOR, Profiler
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; runs are then unlimited
+    resource = None
+
+# Modules snippets may import
+ALLOWED_MODULES = (
+    "math", "random", "datetime", "json",
+    "typing", "collections", "itertools", "functools"
+)
+
+# Public module attributes that are still left out, since they evaluate
+# strings with the real builtins
+UNSAFE_MODULE_ATTRIBUTES = {
+    "typing": frozenset({"get_type_hints", "ForwardRef"}),
+}
+
+# Attributes that lead from generators, coroutines and tracebacks to the
+# frames that run them, and from there to the worker's own globals
+FRAME_ATTRIBUTES = frozenset({
+    "gi_frame", "gi_code", "cr_frame", "cr_code", "ag_frame", "ag_code",
+    "tb_frame", "tb_next", "f_back", "f_globals", "f_locals", "f_builtins", "f_code"
+})
+
+SAFE_BUILTINS = (
+    "print", "len", "str", "int", "float", "bool", "list", "dict", "set",
+    "tuple", "range", "enumerate", "zip", "min", "max", "sum", "abs", "round"
+)
+
+DEFAULT_WORKERS = 2
+
+DEFAULT_CPU_SECONDS = 2
+DEFAULT_MEMORY_MB = 100
+DEFAULT_OUTPUT_CHARS = 1 << 20
+
+# Characters of a run's output kept from its start and from its end
+CAPTURE_HEAD_CHARS = 32 * 1024
+CAPTURE_TAIL_CHARS = 32 * 1024
+
+# Streamed output is sent once this many characters are pending, or after
+# this many seconds
+STREAM_CHUNK_CHARS = 4096
+STREAM_INTERVAL = 0.1
+
+# Fraction of a limit above which a run is reported as resource hungry
+NEAR_LIMIT = 0.8
+
+# Modules whose use makes a snippet's result unfit for caching
+NONDETERMINISTIC_MODULES = frozenset({"random", "datetime", "time", "uuid", "secrets", "os"})
+
+# Compiled snippets each worker keeps in memory, and the size from which a
+# snippet's code object is also stored on disk
+BYTECODE_CACHE_SIZE = 128
+BYTECODE_DISK_MIN_CHARS = 4096
+
+# Version of the checks in ``check_snippet``, part of the bytecode cache
+# key so that code objects compiled before a change are checked again
+SNIPPET_CHECK_VERSION = 1
+
+# Seconds between checks of a run's cancellation event
+CANCEL_POLL_INTERVAL = 0.05
+
+# Workers are replaced after this many runs, which bounds how long state a
+# snippet leaves behind in an imported module can live
+MAX_JOBS_PER_WORKER = 100
+
+
+class Limits(NamedTuple):
+    """Resource limits of one run; 0 disables a limit."""
+    cpu_seconds: float = DEFAULT_CPU_SECONDS
+    memory_mb: int = DEFAULT_MEMORY_MB
+    output_chars: int = DEFAULT_OUTPUT_CHARS
+
+
+class LimitExceeded(Exception):
+    """Raised inside a run that went over one of its limits."""
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+class RestrictedAccess(Exception):
+    """Raised for a snippet that reads private, special or frame attributes."""
+
+
+# Compilation errors that are cached like code objects
+_COMPILE_ERRORS = {
+    error.__name__: error
+    for error in (SyntaxError, IndentationError, TabError, ValueError, RestrictedAccess)
+}
+
+
+def check_snippet(tree: ast.AST) -> None:
+    """Rejects attribute access that leads out of the restricted globals.
+
+    Python-level functions keep their module's ``__globals__``, bound
+    methods their ``__self__`` and generators their frames, and each of
+    these reaches the real builtins. Snippets therefore may not use
+    attributes that start with an underscore or lead to a frame; they
+    cannot define classes either, since ``__build_class__`` is not among
+    their builtins.
+
+    Raises:
+        RestrictedAccess: for the first such attribute
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and (node.attr.startswith('_') or node.attr in FRAME_ATTRIBUTES):
+            raise RestrictedAccess(f"Access to attribute {node.attr!r} is not allowed (line {node.lineno})")
+
+
+def compile_snippet(code: str) -> types.CodeType:
+    """Compiles ``code`` after ``check_snippet``."""
+    tree = ast.parse(code, '<string>', 'exec')
+    check_snippet(tree)
+    return compile(tree, '<string>', 'exec')
+
+
+class _Capture:
+    """Bounded output buffer that keeps the head and tail of what was written.
+
+    Memory stays bounded however much a run prints; the middle is replaced
+    by a truncation marker. Writing more than ``limit`` characters in total
+    stops the run. ``on_write`` receives every accepted chunk, for streaming.
+    """
+
+    def __init__(
+        self,
+        limit: int = 0,
+        head_chars: int = CAPTURE_HEAD_CHARS,
+        tail_chars: int = CAPTURE_TAIL_CHARS,
+        on_write: Optional[Callable[[str], None]] = None
+    ):
+        self.limit = limit
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.on_write = on_write
+        self.size = 0
+        self._head: List[str] = []
+        self._head_size = 0
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+
+    def write(self, text: str) -> int:
+        exceeded = self.limit and self.size + len(text) > self.limit
+        if exceeded:
+            text = text[:self.limit - self.size]
+        self._append(text)
+        if self.on_write is not None and text:
+            self.on_write(text)
+        if exceeded:
+            raise LimitExceeded("output", f"Output exceeded {self.limit} characters")
+        return len(text)
+
+    def _append(self, text: str) -> None:
+        self.size += len(text)
+        room = self.head_chars - self._head_size
+        if room > 0:
+            self._head.append(text[:room])
+            self._head_size += min(room, len(text))
+            text = text[room:]
+        if not text:
+            return
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail_size - len(self._tail[0]) >= self.tail_chars:
+            self._tail_size -= len(self._tail.popleft())
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        tail = "".join(self._tail)
+        if len(tail) > self.tail_chars:
+            tail = tail[-self.tail_chars:]
+        dropped = self.size - self._head_size - len(tail)
+        if dropped:
+            return f"{''.join(self._head)}\n... [{dropped} characters truncated] ...\n{tail}"
+        return "".join(self._head) + tail
+
+
+class _OutputStreamer:
+    """Sends a run's output to the parent in chunks while the run goes on.
+
+    Output is sent when ``STREAM_CHUNK_CHARS`` have accumulated, and by a
+    background thread every ``STREAM_INTERVAL`` seconds, so output shows up
+    even while the snippet computes silently.
+    """
+
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.pending: List[Tuple[str, str]] = []
+        self.pending_size = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.thread.start()
+
+    def writer(self, stream: str) -> Callable[[str], None]:
+        def write(text: str) -> None:
+            with self.lock:
+                self.pending.append((stream, text))
+                self.pending_size += len(text)
+                if self.pending_size >= STREAM_CHUNK_CHARS:
+                    self._flush()
+        return write
+
+    def _flush(self) -> None:
+        chunks, self.pending, self.pending_size = self.pending, [], 0
+        merged: List[Tuple[str, List[str]]] = []
+        for stream, text in chunks:
+            if merged and merged[-1][0] == stream:
+                merged[-1][1].append(text)
+            else:
+                merged.append((stream, [text]))
+        for stream, texts in merged:
+            self.conn.send(("output", stream, "".join(texts)))
+
+    def _flush_periodically(self) -> None:
+        while not self.stopped.wait(STREAM_INTERVAL):
+            with self.lock:
+                self._flush()
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self._flush()
+
+
+class CodeCache:
+    """Compiled code objects keyed by a hash of the source.
+
+    Recent entries are kept in memory. With a ``directory``, snippets of at
+    least ``BYTECODE_DISK_MIN_CHARS`` characters are also marshalled to
+    disk, where every worker of the pool finds them. Compilation errors are
+    cached too, so invalid input is rejected without recompiling.
+    """
+
+    def __init__(self, maxsize: int = BYTECODE_CACHE_SIZE, directory: Optional[str] = None):
+        self.memory = LRUCache(maxsize)
+        self.directory = directory
+        self.compiled = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[-2:], key)
+
+    def _load(self, key: str) -> Any:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _save(self, key: str, entry: Any) -> None:
+        path = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so other workers never read partial data
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(entry, f)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except (OSError, ValueError):
+            pass
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def compile(self, code: str) -> types.CodeType:
+        """Returns the code object of ``code``, raising its cached compilation error."""
+        # The magic number changes with the bytecode format
+        key = content_hash(f"{importlib.util.MAGIC_NUMBER.hex()}\0{SNIPPET_CHECK_VERSION}\0{code}")
+        entry = self.memory.get(key)
+        if entry is None:
+            on_disk = self.directory is not None and len(code) >= BYTECODE_DISK_MIN_CHARS
+            if on_disk:
+                entry = self._load(key)
+            if entry is None:
+                try:
+                    entry = compile_snippet(code)
+                except tuple(_COMPILE_ERRORS.values()) as e:
+                    entry = (type(e).__name__, e.args)
+                self.compiled += 1
+                if on_disk:
+                    self._save(key, entry)
+            self.memory.put(key, entry)
+        if isinstance(entry, tuple):
+            name, args = entry
+            raise _COMPILE_ERRORS[name](*args)
+        return entry
+
+
+def _public_copy(name: str, module: types.ModuleType) -> types.ModuleType:
+    """Copy of ``module`` with the attributes snippets may use.
+
+    Private names, other modules and ``UNSAFE_MODULE_ATTRIBUTES`` are left
+    out. The copy only keeps snippets from patching the shared module; the
+    functions in it still hold the real module's globals, which
+    ``check_snippet`` keeps snippets from reaching.
+    """
+    unsafe = UNSAFE_MODULE_ATTRIBUTES.get(name, frozenset())
+    copy = types.ModuleType(name)
+    copy.__dict__.update(
+        (attr, value) for attr, value in vars(module).items()
+        if not attr.startswith('_') and attr not in unsafe and not isinstance(value, types.ModuleType)
+    )
+    return copy
+
+
+def _restricted_globals(modules: Dict[str, types.ModuleType]) -> Dict[str, Any]:
+    """Globals for one run: safe builtins and per-run copies of the allowed modules."""
+    imported: Dict[str, types.ModuleType] = {}
+
+    def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name not in modules:
+            raise ImportError(f"Import of {name!r} is not allowed")
+        module = imported.get(name)
+        if module is None:
+            # Snippets get a copy, so patching e.g. math.pi does not leak
+            # into later runs on the same worker
+            module = imported[name] = _public_copy(name, modules[name])
+        return module
+
+    safe_builtins: Dict[str, Any] = {name: getattr(builtins, name) for name in SAFE_BUILTINS}
+    safe_builtins.update({
+        'True': True,
+        'False': False,
+        'None': None,
+        '__import__': safe_import,
+    })
+    return {
+        '__builtins__': safe_builtins,
+        '__name__': '__main__',
+        '__doc__': None,
+        '__package__': None,
+    }
+
+
+def _memory_kib() -> Dict[str, int]:
+    """Virtual size, resident size and peak resident size of this process."""
+    fields = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(("VmSize:", "VmRSS:", "VmHWM:")):
+                    name, value = line.split(":", 1)
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return fields
+
+
+def _reset_peak_rss() -> None:
+    # Linux resets VmHWM to the current RSS, making the peak per run
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _set_soft_limit(kind: int, value: int) -> Optional[int]:
+    soft, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    try:
+        resource.setrlimit(kind, (value, hard))
+    except (ValueError, OSError):
+        return None
+    return soft
+
+
+def _cpu_seconds(limits: Limits, profile: bool) -> float:
+    """CPU-time limit of a run, raised for the overhead of profiling."""
+    return limits.cpu_seconds * PROFILED_CPU_FACTOR if profile else limits.cpu_seconds
+
+
+def empty_usage() -> Dict[str, Any]:
+    """Usage of a run that never reported back."""
+    return {
+        "peak_rss_mb": 0.0,
+        "memory_used_mb": 0.0,
+        "cpu_user_time": 0.0,
+        "cpu_system_time": 0.0,
+        "allocated_blocks": 0,
+        "output_chars": 0
+    }
+
+
+def run_snippet(
+    code: str,
+    modules: Dict[str, types.ModuleType],
+    limits: Limits = Limits(),
+    streamer: Optional[_OutputStreamer] = None,
+    code_cache: Optional[CodeCache] = None,
+    profile: bool = False,
+    monitor: bool = False
+) -> Dict[str, Any]:
+    """Runs ``code`` with restricted builtins and captures its output.
+
+    The CPU-time and address-space limits are applied to the current
+    process for the duration of the run, so this is meant to be called in
+    a sandbox worker; a profiled run gets ``PROFILED_CPU_FACTOR`` times the
+    CPU time. With a ``streamer``, output is also sent as it is written;
+    with a ``code_cache``, the code is compiled through it.
+
+    Returns:
+        Dict with status ("success" or "error"), stdout, stderr, error,
+        message, execution_time, usage, limit_exceeded (the limit that
+        stopped the run, if any), with ``profile``, the
+        ``Profiler.results`` of the run and, with ``monitor``, its
+        ``Monitor.results``. Profiling takes precedence over monitoring.
+    """
+    stdout_buffer = _Capture(limits.output_chars, on_write=streamer and streamer.writer("stdout"))
+    stderr_buffer = _Capture(limits.output_chars, on_write=streamer and streamer.writer("stderr"))
+    status, error, message, limit_exceeded = "success", "", "", None
+
+    memory_before = _memory_kib()
+    _reset_peak_rss()
+    saved_limits = {}
+    if resource is not None:
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        if limits.cpu_seconds:
+            used = usage_before.ru_utime + usage_before.ru_stime
+            saved_limits[resource.RLIMIT_CPU] = _set_soft_limit(
+                resource.RLIMIT_CPU, math.ceil(used + _cpu_seconds(limits, profile))
+            )
+        if limits.memory_mb and "VmSize" in memory_before:
+            saved_limits[resource.RLIMIT_AS] = _set_soft_limit(
+                resource.RLIMIT_AS, (memory_before["VmSize"] + limits.memory_mb * 1024) * 1024
+            )
+
+    namespace = _restricted_globals(modules)
+    profiler = Profiler() if profile else None
+    tracer = Monitor(code) if monitor and not profile else None
+    blocks_before = sys.getallocatedblocks()
+    start_time = time.perf_counter()
+    try:
+        try:
+            if code_cache is not None:
+                compiled_code = code_cache.compile(code)
+            else:
+                compiled_code = compile_snippet(code)
+            with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
+                if profiler is not None:
+                    profiler.run(compiled_code, namespace)
+                elif tracer is not None:
+                    tracer.run(compiled_code, namespace)
+                else:
+                    exec(compiled_code, namespace)
+        finally:
+            execution_time = time.perf_counter() - start_time
+            allocated_blocks = sys.getallocatedblocks() - blocks_before
+            for kind, soft in saved_limits.items():
+                if soft is not None:
+                    _set_soft_limit(kind, soft)
+    except BaseException as e:
+        status, error, message = "error", f"{type(e).__name__}: {str(e)}", str(e)
+        if isinstance(e, LimitExceeded):
+            limit_exceeded = e.limit
+        elif isinstance(e, MemoryError):
+            limit_exceeded = "memory"
+    del namespace
+
+    usage = empty_usage()
+    memory_after = _memory_kib()
+    if "VmHWM" in memory_after:
+        usage["peak_rss_mb"] = memory_after["VmHWM"] / 1024
+        usage["memory_used_mb"] = max(0, memory_after["VmHWM"] - memory_before.get("VmRSS", 0)) / 1024
+    if resource is not None:
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        usage["cpu_user_time"] = usage_after.ru_utime - usage_before.ru_utime
+        usage["cpu_system_time"] = usage_after.ru_stime - usage_before.ru_stime
+        if not usage["peak_rss_mb"]:
+            usage["peak_rss_mb"] = usage_after.ru_maxrss / 1024
+    usage["allocated_blocks"] = allocated_blocks
+    usage["output_chars"] = stdout_buffer.size + stderr_buffer.size
+
+    return {
+        "status": status,
+        "stdout": stdout_buffer.getvalue(),
+        "stderr": stderr_buffer.getvalue(),
+        "error": error,
+        "message": message,
+        "execution_time": execution_time,
+        "usage": usage,
+        "limit_exceeded": limit_exceeded,
+        "profile": profiler.results() if profiler is not None else {},
+        "monitor": tracer.results() if tracer is not None else {}
+    }
+
+
+def resource_issues(result: Dict[str, Any], limits: Limits) -> List[Dict[str, Any]]:
+    """Runtime issues for a run that went over, or came near, one of its limits."""
+    usage = result.get("usage") or empty_usage()
+    cpu_seconds = _cpu_seconds(limits, bool(result.get("profile")))
+    measured = (
+        ("cpu", "CPU time", usage["cpu_user_time"] + usage["cpu_system_time"], cpu_seconds, "s"),
+        ("memory", "memory usage", usage["memory_used_mb"], limits.memory_mb, "MB"),
+        ("output", "output size", usage["output_chars"], limits.output_chars, " characters"),
+    )
+    issues = []
+    for limit, label, used, allowed, unit in measured:
+        if limit == result.get("limit_exceeded"):
+            issues.append({
+                "type": "resource_usage",
+                "rule": "resource_usage",
+                "description": f"{label[0].upper()}{label[1:]} limit of {allowed}{unit} exceeded",
+                "severity": "high"
+            })
+        elif allowed and used >= allowed * NEAR_LIMIT:
+            issues.append({
+                "type": "resource_usage",
+                "rule": "resource_usage",
+                "description": f"High {label}: {used:.1f}{unit} of {allowed}{unit} allowed",
+                "severity": "medium"
+            })
+    return issues
+
+
+def _cpu_limit_handler(signum: int, frame: Any) -> None:
+    raise LimitExceeded("cpu", "CPU time limit exceeded")
+
+
+def _worker_main(conn: Any, bytecode_dir: Optional[str] = None) -> None:
+    modules = {name: importlib.import_module(name) for name in ALLOWED_MODULES}
+    code_cache = CodeCache(directory=bytecode_dir)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _cpu_limit_handler)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        if job["stream"]:
+            streamer = _OutputStreamer(conn)
+            try:
+                result = run_snippet(
+                    job["code"], modules, job["limits"], streamer, code_cache, job["profile"], job["monitor"]
+                )
+            finally:
+                streamer.close()
+        else:
+            result = run_snippet(
+                job["code"], modules, job["limits"], code_cache=code_cache,
+                profile=job["profile"], monitor=job["monitor"]
+            )
+        conn.send(("result", result))
+
+
+def _context() -> Any:
+    # The fork server is a single-threaded process with the modules already
+    # imported, so workers start quickly and safely from a threaded server
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__, *ALLOWED_MODULES])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "jobs")
+
+    def __init__(self, process: Any, conn: Any):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+
+
+class SandboxPool:
+    """Fixed-size pool of worker processes that run snippets one at a time.
+
+    ``run`` is thread-safe; callers wait for an idle worker, which goes to
+    the waiting run with the lowest ``priority`` value first, and among
+    equal priorities to the run that has waited longest.
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_WORKERS,
+        max_jobs: int = MAX_JOBS_PER_WORKER,
+        bytecode_dir: Optional[str] = None
+    ):
+        self.size = max(1, size)
+        self.base_size = self.size
+        self.max_jobs = max_jobs
+        self.bytecode_dir = bytecode_dir
+        self.replaced = 0
+        self._context = _context()
+        self._idle: List[_Worker] = []
+        self._available = threading.Condition()
+        # Heap of (priority, ticket) of the runs waiting for a worker
+        self._waiting: List[Tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._closed = False
+        self._lock = threading.Lock()
+        # Sizes asked for by the running ``reserve`` blocks, and workers to
+        # stop instead of reusing once their run ends
+        self._reservations: List[int] = []
+        self._surplus = 0
+        for _ in range(self.size):
+            self._release(self._start())
+
+    @contextlib.contextmanager
+    def reserve(self, size: int) -> Iterator[None]:
+        """Grows the pool to at least ``size`` workers for the duration of the block.
+
+        The extra workers are stopped once no block needs them, as soon as
+        they are idle.
+        """
+        with self._lock:
+            self._reservations.append(size)
+            self._resize()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reservations.remove(size)
+                self._resize()
+
+    def _resize(self) -> None:
+        """Starts or retires workers to match the largest reservation; holds ``_lock``."""
+        target = max([self.base_size] + self._reservations)
+        while self.size < target and not self._closed:
+            if self._surplus:
+                # A worker due to be retired can stay instead
+                self._surplus -= 1
+            else:
+                self._release(self._start())
+            self.size += 1
+        if self.size > target:
+            self._surplus += self.size - target
+            self.size = target
+            retired = []
+            with self._available:
+                while self._surplus and self._idle:
+                    retired.append(self._idle.pop())
+                    self._surplus -= 1
+            for worker in retired:
+                self._stop(worker, graceful=True)
+
+    def _retire(self) -> bool:
+        """Whether a worker whose run ended should be stopped to shrink the pool."""
+        with self._lock:
+            if self._surplus:
+                self._surplus -= 1
+                return True
+            return False
+
+    def _start(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.bytecode_dir), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _acquire(
+        self,
+        priority: int,
+        cancel: Optional[threading.Event] = None,
+        end_time: Optional[float] = None
+    ) -> Optional[_Worker]:
+        """Waits for an idle worker; None if ``cancel`` is set or ``end_time`` passes first."""
+        with self._available:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            while not (self._idle and self._waiting[0] == ticket):
+                wait = CANCEL_POLL_INTERVAL if cancel is not None else None
+                if end_time is not None:
+                    remaining = end_time - time.perf_counter()
+                    wait = remaining if wait is None else min(wait, remaining)
+                if (cancel is not None and cancel.is_set()) or (wait is not None and wait <= 0):
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._available.notify_all()
+                    return None
+                self._available.wait(wait)
+            heapq.heappop(self._waiting)
+            worker = self._idle.pop()
+            # The next run in line may find another idle worker
+            self._available.notify_all()
+            return worker
+
+    def _release(self, worker: _Worker) -> None:
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify_all()
+
+    @staticmethod
+    def _stop(worker: _Worker, graceful: bool = False) -> None:
+        if graceful:
+            try:
+                worker.conn.send(None)
+                worker.process.join(1)
+            except OSError:
+                pass
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(1)
+        worker.conn.close()
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        limits: Optional[Limits] = None,
+        profile: bool = False,
+        monitor: bool = False,
+        priority: int = 0,
+        cancel: Optional[threading.Event] = None,
+        end_time: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Runs ``code`` in a worker, killing it after ``timeout`` seconds.
+
+        The timeout starts once a worker is free; ``priority`` orders the
+        runs waiting for one, lowest first. Setting ``cancel`` stops the
+        run: it leaves the queue, or its worker is killed and replaced. A
+        run still waiting at ``end_time`` (a ``time.perf_counter()`` value)
+        is skipped, and one that starts before gets at most the time left.
+
+        Returns:
+            The ``run_snippet`` result; status is "timeout" when the worker
+            had to be killed, "cancelled" when ``cancel`` was set, "skipped"
+            when ``end_time`` passed first and "crashed" when the worker died
+        """
+        for event in self._run(code, timeout, limits, False, profile, monitor, priority, cancel, end_time):
+            pass
+        return event["result"]
+
+    def stream(
+        self,
+        code: str,
+        timeout: float,
+        limits: Optional[Limits] = None,
+        profile: bool = False,
+        monitor: bool = False,
+        priority: int = 0
+    ) -> Iterator[Dict[str, Any]]:
+        """Runs ``code`` like ``run``, yielding its output while it runs.
+
+        Yields:
+            ``{"stream": "stdout" or "stderr", "text": ...}`` for each chunk
+            of output, then ``{"result": ...}`` with the ``run`` result. A
+            run that is abandoned before its result is killed.
+        """
+        return self._run(code, timeout, limits, True, profile, monitor, priority)
+
+    def _run(
+        self,
+        code: str,
+        timeout: float,
+        limits: Optional[Limits],
+        stream: bool,
+        profile: bool,
+        monitor: bool = False,
+        priority: int = 0,
+        cancel: Optional[threading.Event] = None,
+        end_time: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        if self._closed:
+            raise RuntimeError("SandboxPool is closed")
+        worker = None if cancel is not None and cancel.is_set() else self._acquire(priority, cancel, end_time)
+        if worker is None:
+            cancelled = cancel is not None and cancel.is_set()
+            yield {"result": _cancelled_result(0.0) if cancelled else skipped_result()}
+            return
+        start_time = time.perf_counter()
+        deadline = start_time + timeout
+        if end_time is not None and end_time < deadline:
+            deadline = end_time
+            timeout = round(end_time - start_time, 3)
+        # What was streamed before a timeout is still worth returning
+        partial = {"stdout": _Capture(), "stderr": _Capture()}
+        healthy = False
+        try:
+            worker.conn.send({
+                "code": code,
+                "limits": limits or Limits(),
+                "stream": stream,
+                "profile": profile,
+                "monitor": monitor
+            })
+            while True:
+                remaining = max(0.0, deadline - time.perf_counter())
+                # With a cancel event, wait in short slices so it is noticed
+                wait = remaining if cancel is None else min(remaining, CANCEL_POLL_INTERVAL)
+                if not worker.conn.poll(wait):
+                    if cancel is not None and cancel.is_set():
+                        result = _cancelled_result(time.perf_counter() - start_time)
+                        break
+                    if wait < remaining:
+                        continue
+                    result = {
+                        "status": "timeout",
+                        "error": f"TimeoutError: execution exceeded {timeout}s",
+                        "message": f"Execution exceeded the {timeout}s time limit"
+                    }
+                    break
+                message = worker.conn.recv()
+                if message[0] == "result":
+                    result = message[1]
+                    worker.jobs += 1
+                    healthy = True
+                    break
+                _, name, text = message
+                partial[name].write(text)
+                yield {"stream": name, "text": text}
+        except (EOFError, OSError):
+            result = {
+                "status": "crashed",
+                "error": f"WorkerCrash: worker exited with code {worker.process.exitcode}",
+                "message": "The sandbox worker exited unexpectedly"
+            }
+        finally:
+            if self._closed:
+                self._stop(worker, graceful=healthy)
+            elif self._retire():
+                self._stop(worker, graceful=healthy)
+            elif healthy and worker.jobs < self.max_jobs:
+                self._release(worker)
+            else:
+                self._stop(worker)
+                self.replaced += 1
+                self._release(self._start())
+
+        if result["status"] == "cancelled":
+            result.update(stdout=partial["stdout"].getvalue(), stderr=partial["stderr"].getvalue())
+        elif result["status"] in ("timeout", "crashed"):
+            result.update(
+                stdout=partial["stdout"].getvalue(), stderr=partial["stderr"].getvalue(),
+                execution_time=time.perf_counter() - start_time,
+                usage=empty_usage(), limit_exceeded=None, profile={}, monitor={}
+            )
+        yield {"result": result}
+
+    def close(self) -> None:
+        """Stops every idle worker; workers busy with a run are stopped when it ends."""
+        self._closed = True
+        with self._available:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._stop(worker, graceful=True)
+
+
+def skipped_result() -> Dict[str, Any]:
+    """Result of a run whose batch deadline passed before it could start."""
+    return dict(
+        status="skipped", stdout="", stderr="", error="",
+        message="The batch deadline passed before this snippet ran",
+        execution_time=0.0, usage=empty_usage(), limit_exceeded=None, profile={}, monitor={}
+    )
+
+
+def _cancelled_result(execution_time: float) -> Dict[str, Any]:
+    return dict(
+        status="cancelled", stdout="", stderr="", error="",
+        message="The run was cancelled", execution_time=execution_time,
+        usage=empty_usage(), limit_exceeded=None, profile={}, monitor={}
+    )
+
+
+_default_pool: Optional[SandboxPool] = None
+_default_lock = threading.Lock()
+
+
+def default_pool() -> SandboxPool:
+    """Returns the shared pool, sized by ``BUG_FINDER_SANDBOX_WORKERS``.
+
+    Its workers share compiled snippets through ``BUG_FINDER_BYTECODE_DIR``
+    when that is set.
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool(
+                int(os.getenv("BUG_FINDER_SANDBOX_WORKERS", DEFAULT_WORKERS)),
+                bytecode_dir=os.getenv("BUG_FINDER_BYTECODE_DIR") or None
+            )
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def is_deterministic(code: str) -> bool:
+    """Whether ``code`` uses none of the nondeterministic modules.
+
+    Snippets that do not parse are deterministic: they always fail the same
+    way. Any use of ``__import__`` counts as nondeterministic, since the
+    module name may be computed.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        elif isinstance(node, ast.Name) and node.id == "__import__":
+            return False
+        else:
+            continue
+        if any(name.split(".")[0] in NONDETERMINISTIC_MODULES for name in names):
+            return False
+    return True
+
+
+class ExecutionCache:
+    """LRU cache of results of deterministic snippets.
+
+    Results are keyed by a hash of the source, the sandbox's builtins and
+    modules, the timeout and the limits, since a run that fits one timeout
+    or limit may not fit a smaller one. Runs that were stopped by a limit,
+    timed out or crashed depend on the load of the host and are never
+    cached.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.results = LRUCache(maxsize)
+
+    def key(self, code: str, timeout: float, limits: Limits) -> Optional[str]:
+        """Cache key of a run, or None when the cache is off or ``code`` is nondeterministic."""
+        if self.results.maxsize <= 0 or not is_deterministic(code):
+            return None
+        config = repr((SAFE_BUILTINS, ALLOWED_MODULES, float(timeout), tuple(limits)))
+        return content_hash(f"{config}\0{code}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.results.get(key)
+        if result is None:
+            return None
+        return dict(result, usage=dict(result["usage"]), cached=True)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if result["status"] in ("success", "error") and not result["limit_exceeded"]:
+            self.results.put(key, dict(result, usage=dict(result["usage"])))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.results.stats()
+
+
+_default_cache: Optional[ExecutionCache] = None
+
+
+def default_cache() -> ExecutionCache:
+    """Returns the shared result cache, sized by ``BUG_FINDER_EXECUTION_CACHE_SIZE``.
+
+    The cache is disabled (size 0) unless that variable is set.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ExecutionCache(int(os.getenv("BUG_FINDER_EXECUTION_CACHE_SIZE", 0)))
+        return _default_cache
+
+
+def execute(
+    code: str,
+    timeout: float,
+    limits: Optional[Limits] = None,
+    profile: bool = False,
+    monitor: bool = False,
+    priority: int = 0,
+    cancel: Optional[threading.Event] = None,
+    end_time: Optional[float] = None
+) -> Dict[str, Any]:
+    """Runs ``code`` in the shared pool, answering from the result cache when possible.
+
+    Profiled and monitored runs always execute, since what happens during
+    the run is the point. ``priority`` orders the run among those waiting
+    for a worker, lowest first. ``cancel`` (default: ``aio.cancelled()``,
+    so cancelling an async tool or workflow stage stops its run) kills the
+    run once set. ``end_time`` is as for ``SandboxPool.run``.
+
+    Returns:
+        The ``SandboxPool.run`` result, with ``cached`` set when it came
+        from the cache
+    """
+    limits = limits or Limits()
+    cache = default_cache()
+    key = None if profile or monitor else cache.key(code, timeout, limits)
+    if key is not None:
+        result = cache.get(key)
+        if result is not None:
+            return result
+    if cancel is None:
+        cancel = aio.cancelled()
+    result = default_pool().run(code, timeout, limits, profile, monitor, priority, cancel, end_time)
+    if key is not None:
+        cache.put(key, result)
+    result["cached"] = False
+    return result
+
+
+def execute_stream(code: str, timeout: float, limits: Optional[Limits] = None) -> Iterator[Dict[str, Any]]:
+    """Streaming version of ``execute``; yields the events of ``SandboxPool.stream``."""
+    limits = limits or Limits()
+    cache = default_cache()
+    key = cache.key(code, timeout, limits)
+    result = cache.get(key) if key is not None else None
+    if result is not None:
+        for name in ("stdout", "stderr"):
+            if result[name]:
+                yield {"stream": name, "text": result[name]}
+        yield {"result": result}
+        return
+    for event in default_pool().stream(code, timeout, limits):
+        if "result" in event:
+            result = event["result"]
+            if key is not None:
+                cache.put(key, result)
+            result["cached"] = False
+        yield event
+
+
+def execute_many(
+    snippets: List[str],
+    timeout: float,
+    max_parallel: Optional[int] = None,
+    deadline: Optional[float] = None,
+    limits: Optional[Limits] = None
+) -> List[Dict[str, Any]]:
+    """Runs several snippets across the shared pool.
+
+    The pool is grown to ``max_parallel`` workers (default and maximum: the
+    CPU count) for the duration of the batch. Snippets start cheapest first
+    by their static ``cost.estimate``, so the expensive ones are those left
+    over when the deadline comes. Every snippet gets ``timeout`` seconds, cut short when
+    the batch ``deadline`` (seconds from now) is near; snippets that had not
+    started by the deadline get status "skipped".
+
+    Returns:
+        ``execute`` results in the order of ``snippets``
+    """
+    cpus = os.cpu_count() or 1
+    max_parallel = max(1, min(max_parallel or cpus, cpus, len(snippets) or 1))
+    pool = default_pool()
+    end_time = time.perf_counter() + deadline if deadline is not None else None
+    # The batch's threads do not inherit the caller's context
+    cancel = aio.cancelled()
+
+    estimates = [cost.estimate(code) for code in snippets]
+    priorities = [cost.COST_CLASSES.index(estimate.cost_class) for estimate in estimates]
+    order = sorted(range(len(snippets)), key=lambda index: (priorities[index], estimates[index].operations))
+
+    def run(index: int) -> Dict[str, Any]:
+        if end_time is not None and end_time <= time.perf_counter():
+            return dict(skipped_result(), cached=False)
+        # Snippets still waiting for a worker at the deadline are skipped too
+        return execute(
+            snippets[index], timeout, limits, priority=priorities[index], cancel=cancel, end_time=end_time
+        )
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(snippets)
+    # The extra workers are given back once the batch is done
+    with pool.reserve(max_parallel), concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        for index, result in zip(order, executor.map(run, order)):
+            results[index] = result
+    return results
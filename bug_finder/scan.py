@@ -0,0 +1,181 @@
+"""Repository-scale batch scanning across a process pool."""
+
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from bug_finder import engine, symbols
+
+DEFAULT_CHUNKSIZE = 16
+# Chunks queued per worker; bounds how many results are held at once
+MAX_PENDING_PER_WORKER = 2
+SKIPPED_DIRS = {"__pycache__", "node_modules", "venv"}
+# Files larger than this many bytes are analyzed chunk by chunk
+STREAM_THRESHOLD = 1 << 20
+
+
+def iter_python_files(root: str) -> Iterator[str]:
+    """Yields every ``.py`` file below ``root``, skipping hidden directories."""
+    if os.path.isfile(root):
+        yield root
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and d not in SKIPPED_DIRS
+        )
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                yield os.path.join(dirpath, filename)
+
+
+# Symbol index opened by this (worker) process
+_index: Optional[symbols.SymbolIndex] = None
+
+
+def _open_index(index_path: Optional[str]) -> Optional[symbols.SymbolIndex]:
+    global _index
+    if not index_path:
+        return None
+    if _index is None or _index.path != index_path:
+        _index = symbols.SymbolIndex(index_path)
+    return _index
+
+
+def _scan_large_file(path: str, index: Optional[symbols.SymbolIndex]) -> Dict[str, Any]:
+    """Streams a file through the engine so that memory follows its largest statement."""
+    analysis = engine.StreamingAnalysis(check=index.check if index is not None else None)
+    with open(path, encoding='utf-8', newline='') as f:
+        issues = list(analysis.issues(f, "all"))
+    return {
+        "path": path,
+        "status": "success",
+        "issues": issues,
+        "metrics": analysis.metrics
+    }
+
+
+def _error(path: str, error: BaseException) -> Dict[str, Any]:
+    return {
+        "path": path,
+        "status": "error",
+        "error": f"{type(error).__name__}: {str(error)}",
+        "issues": []
+    }
+
+
+def scan_file(path: str, index_path: Optional[str] = None) -> Dict[str, Any]:
+    """Analyzes one file and returns a JSON-compatible result.
+
+    When ``index_path`` names a symbol index, calls into indexed modules are
+    also checked against their signatures. Files over ``STREAM_THRESHOLD``
+    bytes are streamed, so their issues are ordered by block. A file that
+    cannot be read or analyzed (e.g. nested too deeply for the parser)
+    gets an error result instead of failing the rest of the scan.
+    """
+    try:
+        return _scan_file(path, index_path)
+    except Exception as e:
+        return _error(path, e)
+
+
+def _scan_file(path: str, index_path: Optional[str]) -> Dict[str, Any]:
+    index = _open_index(index_path)
+    if os.path.getsize(path) > STREAM_THRESHOLD:
+        return _scan_large_file(path, index)
+    with open(path, 'rb') as f:
+        code = f.read().decode('utf-8')
+
+    report = engine.analyze(code, use_cache=False)
+    if index is not None:
+        report = index.check(report)
+    if report.syntax_error:
+        issues = [engine.syntax_issue(report)]
+    else:
+        issues = engine.render(report, "all")
+    return {
+        "path": path,
+        "status": "success",
+        "issues": issues,
+        "metrics": report.metrics
+    }
+
+
+def _scan_chunk(paths: List[str], index_path: Optional[str]) -> List[Dict[str, Any]]:
+    return [scan_file(path, index_path) for path in paths]
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def scan(
+    root: str,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    index_path: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Scans every Python file below ``root``, yielding results as they finish.
+
+    Files are handed to a process pool in chunks of ``chunksize`` paths and
+    at most ``MAX_PENDING_PER_WORKER`` chunks per worker are in flight, so
+    memory stays bounded however large the tree is. Results arrive in
+    completion order, not path order.
+
+    Args:
+        root: Directory (or single file) to scan
+        workers: Number of worker processes, defaults to the CPU count
+        chunksize: Number of files handed to a worker at a time
+        index_path: Optional symbol index to check cross-module calls against
+
+    Returns:
+        Iterator of per-file result dicts
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(iter_python_files(root), max(1, chunksize))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in islice(chunks, workers * MAX_PENDING_PER_WORKER):
+            pending.add(executor.submit(_scan_chunk, chunk, index_path))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(executor.submit(_scan_chunk, chunk, index_path))
+                yield from future.result()
+
+
+def has_high_severity(result: Dict[str, Any]) -> bool:
+    return any(issue.get("severity") == "high" for issue in result.get("issues", []))
+
+
+def run_scan(
+    root: str,
+    output: TextIO = sys.stdout,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    index_path: Optional[str] = None
+) -> int:
+    """Streams scan results to ``output`` as JSON Lines.
+
+    Returns:
+        1 if any file has high-severity findings, otherwise 0
+    """
+    exit_code = 0
+    for result in scan(root, workers=workers, chunksize=chunksize, index_path=index_path):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        if has_high_severity(result):
+            exit_code = 1
+    return exit_code
@@ -0,0 +1,336 @@
+"""Persistent cross-module symbol index for checking call signatures.
+
+The index records the signature of every module-level function and class
+method of a project in a local SQLite database. It is built once and then
+updated incrementally: only files whose modification time changed are
+re-parsed. Analyzers resolve calls through the snippet's imports and check
+them against the recorded signatures without parsing any dependency.
+"""
+
+import ast
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from bug_finder.engine import CallSite, Finding, Report
+
+DEFAULT_DB_NAME = ".bug_finder_symbols.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    qualname TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    posonly TEXT NOT NULL,
+    args TEXT NOT NULL,
+    defaults INTEGER NOT NULL,
+    kwonly TEXT NOT NULL,
+    kwonly_required TEXT NOT NULL,
+    vararg INTEGER NOT NULL,
+    kwarg INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+"""
+
+
+class Signature(NamedTuple):
+    """Parameters of an indexed function or method."""
+    qualname: str
+    path: str
+    line: int
+    # "function", "method", "classmethod" or "staticmethod"
+    kind: str
+    posonly: Tuple[str, ...]
+    args: Tuple[str, ...]
+    # Number of defaults, which apply to the last positional parameters
+    defaults: int
+    kwonly: Tuple[str, ...]
+    kwonly_required: Tuple[bool, ...]
+    vararg: bool
+    kwarg: bool
+
+
+def module_name(path: str, root: str) -> str:
+    """Dotted module name of ``path`` relative to the project ``root``."""
+    relative = os.path.splitext(os.path.relpath(path, root))[0]
+    parts = relative.split(os.sep)
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def _signature(node: ast.AST, qualname: str, path: str, kind: str) -> Signature:
+    args = node.args
+    return Signature(
+        qualname, path, node.lineno, kind,
+        tuple(arg.arg for arg in args.posonlyargs),
+        tuple(arg.arg for arg in args.args),
+        len(args.defaults),
+        tuple(arg.arg for arg in args.kwonlyargs),
+        tuple(default is None for default in args.kw_defaults),
+        args.vararg is not None,
+        args.kwarg is not None
+    )
+
+
+def _kind(node: ast.AST, in_class: bool) -> Optional[str]:
+    """Classifies a definition, or returns None if its signature can't be trusted."""
+    decorators = [
+        decorator.id for decorator in node.decorator_list
+        if isinstance(decorator, ast.Name)
+    ]
+    # Any other decorator may replace the signature
+    if len(decorators) != len(node.decorator_list):
+        return None
+    if not in_class:
+        return "function" if not decorators else None
+    if not decorators:
+        return "method"
+    if decorators in (["classmethod"], ["staticmethod"]):
+        return decorators[0]
+    return None
+
+
+def extract_signatures(tree: ast.Module, module: str, path: str) -> Iterator[Signature]:
+    """Yields the signatures of the module-level functions and class methods."""
+    def visit(body: List[ast.stmt], prefix: str, in_class: bool) -> Iterator[Signature]:
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = _kind(node, in_class)
+                if kind is not None:
+                    yield _signature(node, f"{prefix}.{node.name}", path, kind)
+            elif isinstance(node, ast.ClassDef):
+                yield from visit(node.body, f"{prefix}.{node.name}", True)
+            elif isinstance(node, (ast.If, ast.Try)):
+                # Conditional definitions, e.g. version or import fallbacks
+                yield from visit(node.body, prefix, in_class)
+                yield from visit(node.orelse, prefix, in_class)
+                for handler in getattr(node, 'handlers', ()):
+                    yield from visit(handler.body, prefix, in_class)
+
+    return visit(tree.body, module, False)
+
+
+def check_call(signature: Signature, call: CallSite, bound: bool) -> Optional[str]:
+    """Checks a call against a signature.
+
+    Args:
+        signature: Signature of the callee
+        call: The call site
+        bound: Whether the first parameter is bound (``self`` or ``cls``)
+
+    Returns:
+        A description of the problem, or None if the call binds
+    """
+    if call.unpacked:
+        return None
+
+    positional = signature.posonly + signature.args
+    posonly_count = len(signature.posonly)
+    first_default = len(positional) - signature.defaults
+    if bound:
+        if not positional:
+            return None
+        positional = positional[1:]
+        posonly_count = max(0, posonly_count - 1)
+        first_default -= 1
+
+    if call.nargs > len(positional) and not signature.vararg:
+        return f"takes {len(positional)} positional argument(s) but {call.nargs} were given"
+
+    for keyword in call.keywords:
+        if keyword in positional[:posonly_count]:
+            if not signature.kwarg:
+                return f"positional-only argument '{keyword}' passed as keyword"
+        elif keyword in positional[:call.nargs]:
+            return f"got multiple values for argument '{keyword}'"
+        elif keyword not in positional and keyword not in signature.kwonly and not signature.kwarg:
+            return f"got an unexpected keyword argument '{keyword}'"
+
+    missing = [
+        name for i, name in enumerate(positional)
+        if call.nargs <= i < first_default
+        and (i < posonly_count or name not in call.keywords)
+    ]
+    missing.extend(
+        name for name, required in zip(signature.kwonly, signature.kwonly_required)
+        if required and name not in call.keywords
+    )
+    if missing:
+        return f"missing required argument(s): {', '.join(missing)}"
+    return None
+
+
+class SymbolIndex:
+    """SQLite-backed index of function and method signatures."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # Qualified name -> signature (or None); lookups hit SQLite once per name
+        self._memo: Dict[str, Optional[Signature]] = {}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def update(self, root: str) -> Dict[str, int]:
+        """Brings the index up to date with the Python files below ``root``.
+
+        Returns:
+            Dict with the number of files indexed, unchanged and removed
+        """
+        from bug_finder.scan import iter_python_files
+
+        root = os.path.abspath(root)
+        stats = {"indexed": 0, "unchanged": 0, "removed": 0}
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM files"))
+            seen = set()
+            for path in iter_python_files(root):
+                path = os.path.abspath(path)
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                seen.add(path)
+                if known.get(path) == mtime:
+                    stats["unchanged"] += 1
+                    continue
+                self._index_file(path, mtime, module_name(path, root))
+                stats["indexed"] += 1
+
+            for path in set(known) - seen:
+                if path.startswith(root + os.sep):
+                    self._conn.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                    stats["removed"] += 1
+
+            self._conn.commit()
+            self._memo.clear()
+        return stats
+
+    def _index_file(self, path: str, mtime: float, module: str) -> None:
+        self._conn.execute("DELETE FROM symbols WHERE path = ?", (path,))
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        signature.qualname, signature.path, signature.line, signature.kind,
+                        json.dumps(signature.posonly), json.dumps(signature.args),
+                        signature.defaults, json.dumps(signature.kwonly),
+                        json.dumps(signature.kwonly_required),
+                        int(signature.vararg), int(signature.kwarg)
+                    )
+                    for signature in extract_signatures(tree, module, path)
+                ]
+            )
+        self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (path, mtime))
+
+    def lookup(self, qualname: str) -> Optional[Signature]:
+        """Returns the signature recorded for ``qualname``, if any."""
+        try:
+            return self._memo[qualname]
+        except KeyError:
+            pass
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM symbols WHERE qualname = ?", (qualname,)
+            ).fetchone()
+        signature = None
+        if row is not None:
+            (qualname, path, line, kind, posonly, args, defaults,
+             kwonly, kwonly_required, vararg, kwarg) = row
+            signature = Signature(
+                qualname, path, line, kind,
+                tuple(json.loads(posonly)), tuple(json.loads(args)), defaults,
+                tuple(json.loads(kwonly)), tuple(json.loads(kwonly_required)),
+                bool(vararg), bool(kwarg)
+            )
+        self._memo[qualname] = signature
+        return signature
+
+    def resolve(self, call: CallSite, imports: Dict[str, str]) -> Optional[Tuple[Signature, bool]]:
+        """Finds the signature a call refers to, and whether it is bound."""
+        head, _, rest = call.name.partition('.')
+        qualified = imports.get(head)
+        if qualified is None:
+            return None
+        if rest:
+            qualified = f"{qualified}.{rest}"
+
+        signature = self.lookup(qualified)
+        if signature is not None:
+            # ``Class.method(obj, ...)`` passes self explicitly
+            return signature, signature.kind == "classmethod"
+        # Instantiating a class calls its __init__
+        signature = self.lookup(f"{qualified}.__init__")
+        if signature is not None and signature.kind == "method":
+            return signature, True
+        return None
+
+    def check(self, report: Report) -> Report:
+        """Adds ``signature_mismatch`` findings for calls to indexed symbols."""
+        if report.syntax_error:
+            return report
+        imports: Dict[str, str] = {}
+        for block in report.blocks:
+            imports.update(block.imports)
+        if not imports:
+            return report
+
+        extra = []
+        for index, block in enumerate(report.blocks):
+            for call in block.calls:
+                resolved = self.resolve(call, imports)
+                if resolved is None:
+                    continue
+                signature, bound = resolved
+                problem = check_call(signature, call, bound)
+                if problem is not None:
+                    depth, _, position = call.order
+                    extra.append(Finding(
+                        "signature_mismatch", call.line, (depth, index, position),
+                        (signature.qualname, problem)
+                    ))
+        if not extra:
+            return report
+        findings = sorted(report.findings + tuple(extra), key=lambda finding: finding.order)
+        return report._replace(findings=tuple(findings))
+
+
+_default_index: Optional[SymbolIndex] = None
+_default_lock = threading.Lock()
+
+
+def default_index() -> Optional[SymbolIndex]:
+    """Returns the index configured by ``BUG_FINDER_SYMBOL_INDEX``, if any.
+
+    When ``BUG_FINDER_PROJECT_ROOT`` is also set, the index is brought up to
+    date with that directory the first time it is opened.
+    """
+    global _default_index
+    path = os.getenv("BUG_FINDER_SYMBOL_INDEX")
+    if not path:
+        return None
+    with _default_lock:
+        if _default_index is None or _default_index.path != path:
+            _default_index = SymbolIndex(path)
+            root = os.getenv("BUG_FINDER_PROJECT_ROOT")
+            if root:
+                _default_index.update(root)
+        return _default_index
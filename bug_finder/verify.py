@@ -0,0 +1,218 @@
+"""Checks that suggested fixes compile and remove the findings they fix.
+
+Each fix is applied on its own to the top-level definitions it touches,
+and only that region is re-parsed and re-checked by the rules that flagged
+it, so a fix costs time in the size of the definition rather than of the
+source. Findings that need the whole source (``missing_argument`` and
+``signature_mismatch``) are re-checked with an incremental analysis of the
+fixed source. Fixes that overlap or no longer match the source conflict,
+as in ``patch.apply``.
+
+Findings that no static rule reports (those of sandbox runs, profiling
+and monitoring) cannot be re-checked, so fixes for them are "unverified"
+once they compile. With ``execute=True`` the source with each fix that
+passes applied on its own is also run, next to the original, as one
+``sandbox.execute_many`` batch, so the runs are spread over the sandbox
+workers in parallel; a fix for a failed run (``RUNTIME_RULES``) whose run
+now succeeds is accepted.
+"""
+
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bug_finder import engine, patch, sandbox, symbols
+
+# Time limit for each sandbox run
+DEFAULT_TIMEOUT = 5
+
+# Rules reported by failed runs; a fix for one of them is accepted when
+# its run succeeds
+RUNTIME_RULES = frozenset({"timeout", "execution_error", "runtime_error", "resource_usage"})
+
+# Static findings across definitions, re-checked on the whole fixed source
+GLOBAL_RULES = frozenset({"missing_argument", "signature_mismatch"})
+
+
+class Verdict(NamedTuple):
+    """Outcome of verifying one fix."""
+    index: int
+    # "accepted", "unverified" (it compiles, but nothing can re-check the
+    # finding), "rejected" or "conflicting"
+    status: str
+    rule: str
+    line: int
+    reason: str = ""
+    # Time spent re-checking the fix statically, and running it
+    check_seconds: float = 0.0
+    execution_seconds: float = 0.0
+
+
+class Verification(NamedTuple):
+    """Verdicts for a batch of fixes and the source with the accepted ones applied."""
+    code: str
+    diff: str
+    verdicts: Tuple[Verdict, ...]
+    seconds: float
+
+
+def _fix_rules(fix: Any, report: engine.Report, start: int, end: int) -> Set[str]:
+    """Rules a fix is meant to silence: its own, or those flagging its lines."""
+    rule = patch.fix_field(fix, 'rule', '')
+    if rule:
+        return {rule}
+    return {finding.rule for finding in report.findings if start <= finding.line <= end}
+
+
+def _region(starts: List[int], blocks: Tuple[engine.Block, ...], start: int, end: int) -> Tuple[int, int]:
+    """First line and first line after the top-level definitions covering ``start`` to ``end``."""
+    first = blocks[max(0, bisect_right(starts, start) - 1)]
+    last = blocks[max(0, bisect_right(starts, end) - 1)]
+    return first.start, last.end
+
+
+def _check(
+    code: str,
+    lines: List[str],
+    report: engine.Report,
+    starts: List[int],
+    fix: Any,
+    rules: Set[str]
+) -> Optional[str]:
+    """Why ``fix`` is rejected, or None if it passes."""
+    start = patch.fix_field(fix, 'line', 0)
+    end = patch.fix_field(fix, 'end_line', 0) or start
+
+    if report.blocks:
+        region_start, region_end = _region(starts, report.blocks, start, end)
+    else:
+        # Without blocks (the source does not parse) the region is everything
+        region_start, region_end = 1, len(lines) + 1
+    region = ''.join(lines[region_start - 1:region_end - 1])
+    fixed = patch.apply(region, [{
+        'line': start - region_start + 1,
+        'end_line': end - region_start + 1,
+        'suggested_fix': patch.fix_field(fix, 'suggested_fix', ''),
+    }]).code
+    delta = len(engine.split_lines(fixed)) - len(engine.split_lines(region))
+    local = rules & engine.local_rules()
+    try:
+        findings = engine.recheck(fixed, region_start, local)
+    except SyntaxError as e:
+        line = (e.lineno or 1) + region_start - 1
+        return f"The fixed code does not compile: {e.msg} (line {line})"
+
+    if rules & GLOBAL_RULES:
+        # Findings across definitions need the whole fixed source
+        fixed_report = engine.analyze(patch.apply(code, [fix]).code, use_cache=False, previous=report)
+        index = symbols.default_index()
+        if index is not None:
+            fixed_report = index.check(fixed_report)
+        findings += fixed_report.findings
+
+    for finding in findings:
+        if finding.rule in rules and start <= finding.line <= end + delta:
+            return f"The fixed code is still flagged by {finding.rule} at line {finding.line}"
+    return None
+
+
+def _unchecked(rules: Set[str]) -> Set[str]:
+    """Of ``rules``, those no static rule can re-check."""
+    return set(rules) - engine.local_rules() - GLOBAL_RULES
+
+
+def _run(
+    code: str,
+    fixes: List[Any],
+    timeout: float,
+    max_parallel: Optional[int]
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Runs the original and the source with each fix applied on its own."""
+    snippets = [code] + [patch.apply(code, [fix]).code for fix in fixes]
+    original, *results = sandbox.execute_many(snippets, timeout, max_parallel)
+    return original, results
+
+
+def _failed(result: Dict[str, Any]) -> bool:
+    return result["status"] != "success"
+
+
+def verify(
+    code: str,
+    fixes: List[Any],
+    execute: bool = False,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_parallel: Optional[int] = None
+) -> Verification:
+    """Verifies every fix on its own and applies the accepted ones.
+
+    Args:
+        code: The original source
+        fixes: ``CodeFix`` objects or dicts, as for ``patch.apply``; their
+            ``rule`` names the finding they fix
+        execute: Whether to also run the fixed source of each fix in the
+            sandbox; a fix is rejected if its run fails where the original
+            succeeded, or if it fixes a runtime issue and its run still
+            fails, and accepted if it fixes only runtime issues and its run
+            succeeds
+        timeout: Time limit of each sandbox run
+        max_parallel: Sandbox runs in flight at once, as for
+            ``sandbox.execute_many``
+
+    Returns:
+        The source with the accepted fixes applied, its diff, and one
+        verdict per fix in the order of ``fixes``; unverified fixes are
+        not applied
+    """
+    started = time.perf_counter()
+    lines = patch.source_lines(code)
+    report = engine.analyze(code)
+    starts = [block.start for block in report.blocks]
+
+    verdicts: List[Verdict] = []
+    rules: Dict[int, Set[str]] = {}
+    for index, fix in enumerate(fixes):
+        check_started = time.perf_counter()
+        rule = patch.fix_field(fix, 'rule', '')
+        line = patch.fix_field(fix, 'line', 0)
+        reason = patch.check(lines, fix)
+        if reason is not None:
+            verdicts.append(Verdict(index, "conflicting", rule, line, reason))
+            continue
+        rules[index] = _fix_rules(fix, report, line, patch.fix_field(fix, 'end_line', 0) or line)
+        reason = _check(code, lines, report, starts, fix, rules[index])
+        unchecked = _unchecked(rules[index])
+        if reason is not None:
+            status = "rejected"
+        elif unchecked or not rules[index]:
+            status = "unverified"
+            reason = f"Nothing re-checks {', '.join(sorted(unchecked)) or 'this fix'} statically"
+        else:
+            status = "accepted"
+        verdicts.append(Verdict(index, status, rule, line, reason or "", time.perf_counter() - check_started))
+
+    # Of the fixes that pass on their own, those overlapping an earlier one conflict
+    passed = [verdict.index for verdict in verdicts if verdict.status in ("accepted", "unverified")]
+    for conflict in patch.apply(code, [fixes[index] for index in passed], indexes=passed).conflicts:
+        verdicts[conflict.index] = verdicts[conflict.index]._replace(status="conflicting", reason=conflict.reason)
+
+    passed = [verdict.index for verdict in verdicts if verdict.status in ("accepted", "unverified")]
+    if execute and passed:
+        original, results = _run(code, [fixes[index] for index in passed], timeout, max_parallel)
+        for index, result in zip(passed, results):
+            verdict = verdicts[index]._replace(execution_seconds=result["execution_time"])
+            runtime = bool(rules[index] & RUNTIME_RULES)
+            if _failed(result) and (not _failed(original) or runtime):
+                verdict = verdict._replace(
+                    status="rejected",
+                    reason=f"The fixed code fails in the sandbox: {result['error'] or result['message']}"
+                )
+            elif verdict.status == "unverified" and runtime and _unchecked(rules[index]) <= RUNTIME_RULES:
+                # The run that failed now succeeds
+                verdict = verdict._replace(status="accepted", reason="")
+            verdicts[index] = verdict
+
+    accepted = [verdict.index for verdict in verdicts if verdict.status == "accepted"]
+
+    fixed = patch.apply(code, [fixes[index] for index in accepted], indexes=accepted)
+    return Verification(fixed.code, fixed.diff, tuple(verdicts), time.perf_counter() - started)
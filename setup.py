@@ -11,6 +11,11 @@ setup(
         "astroid>=3.0.1",  # For Python code analysis
         "pylint>=3.0.2"    # For bug detection
     ],
+    entry_points={
+        "console_scripts": [
+            "bug_finder=bug_finder.__main__:main",
+        ],
+    },
     python_requires=">=3.8",
     author="Your Name",
     description="A Google ADK-based system for finding and fixing bugs in Python code",
@@ -0,0 +1,25 @@
+"""Tests for the static cost estimate in bug_finder/cost.py."""
+
+from bug_finder import cost
+
+
+def test_endless_loop_is_unbounded():
+    estimate = cost.estimate("while True:\n    x = 1")
+    assert estimate.cost_class == "unbounded"
+    assert not cost.admit(estimate, 5).run
+
+
+def test_generator_loop_is_not_unbounded():
+    estimate = cost.estimate("def g():\n while True:\n  yield 1")
+    assert estimate.cost_class != "unbounded"
+    assert cost.admit(estimate, 5).run
+
+
+def test_awaiting_loop_is_not_unbounded():
+    estimate = cost.estimate("async def consume(queue):\n    while True:\n        print(await queue.get())")
+    assert estimate.cost_class != "unbounded"
+
+
+def test_yield_in_nested_function_does_not_end_the_loop():
+    estimate = cost.estimate("while True:\n    def g():\n        yield 1")
+    assert estimate.cost_class == "unbounded"
@@ -0,0 +1,19 @@
+"""Tests for the rules in bug_finder/engine.py."""
+
+import pytest
+
+from bug_finder import engine
+
+
+def _rules(code):
+    return [finding.rule for finding in engine.analyze(code).findings]
+
+
+@pytest.mark.parametrize("comparison", ["x is None", "x is not None", "x is True", "x is False"])
+def test_identity_with_singletons_is_not_flagged(comparison):
+    assert "literal_comparison" not in _rules(f"x = 1\nif {comparison}:\n    pass\n")
+
+
+@pytest.mark.parametrize("comparison", ["x is 1", "x is not 'a'", "x is 2.5", "x is b''"])
+def test_identity_with_number_or_string_is_flagged(comparison):
+    assert "literal_comparison" in _rules(f"x = 1\nif {comparison}:\n    pass\n")
@@ -0,0 +1,143 @@
+"""Tests for bug_finder/fast_path.py against a local stub model."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from bug_finder import fast_path
+from bug_finder.cache import TTLCache
+
+CODE = "total = 0\nfor i in range(3):\n    total += i\nprint(total)\n"
+MESSAGE = f"find the bugs\n```python\n{CODE}```"
+
+
+class StubModel:
+    """Answers every request with the same text and counts the calls."""
+
+    def __init__(self, text: str = "Summary from the model"):
+        self.text = text
+        self.requests = []
+
+    def generate(self, llm_request: LlmRequest) -> LlmResponse:
+        self.requests.append(llm_request)
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=self.text)]))
+
+
+class StubTools:
+    """``analyze_code``, ``suggest_fixes`` and ``execute_code`` with canned results."""
+
+    def __init__(self):
+        self.calls = []
+
+    def analyze(self, code):
+        self.calls.append("analyze")
+        bugs = [{"type": "style", "line": 4, "description": "Print function found", "severity": "low"}]
+        return {"status": "success", "bugs_found": bugs, "suggestions": [bugs[0]["description"]]}
+
+    def suggest(self, code, bugs):
+        self.calls.append("suggest")
+        return {"status": "success", "fixes": ["Line 4: Use logging"]}
+
+    def execute(self, code, timeout_seconds, monitor=False):
+        self.calls.append("execute")
+        result = {"stdout": "3\n", "stderr": "", "error": "", "execution_time": 0.001, "runtime_issues": []}
+        return {"status": "success", "result": result}
+
+
+def _fast_path(mode, cache=None):
+    tools = StubTools()
+    return fast_path.FastPath(tools.analyze, tools.suggest, tools.execute, mode=mode, cache=cache), tools
+
+
+def _request(text):
+    return LlmRequest(
+        model="stub-model",
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        config=types.GenerateContentConfig()
+    )
+
+
+def _turn(path, model, text):
+    """One turn the way the agent runs it: callbacks around a model call."""
+    context = SimpleNamespace(state={})
+    llm_request = _request(text)
+    llm_response = asyncio.run(path.before_model(context, llm_request))
+    if llm_response is None:
+        llm_response = model.generate(llm_request)
+        path.after_model(context, llm_response)
+    return "".join(part.text for part in llm_response.content.parts), llm_request
+
+
+def test_recognizes_fenced_block_with_short_request():
+    assert fast_path.recognize(MESSAGE) == fast_path.Submission("find the bugs", CODE)
+
+
+def test_recognizes_bare_program():
+    assert fast_path.recognize(CODE) == fast_path.Submission("", CODE.strip("\n"))
+
+
+@pytest.mark.parametrize("message", [
+    "please could you look over this code of mine and find every bug, thanks so much\n```python\nx = 1\n```",
+    "explain the bugs\n```python\nx = 1\n```",
+    "find the bugs\n```python\nx = 1\n```\nand in\n```python\ny = 2\n```",
+    "hello",
+    "42",
+])
+def test_leaves_other_messages_to_the_model(message):
+    assert fast_path.recognize(message) is None
+
+
+def test_direct_mode_skips_the_model():
+    path, tools = _fast_path("direct")
+    model = StubModel()
+    text, _ = _turn(path, model, MESSAGE)
+    assert model.requests == []
+    assert sorted(tools.calls) == ["analyze", "execute", "suggest"]
+    assert "Print function found" in text
+    assert "Use logging" in text
+
+
+def test_summarize_mode_asks_the_model_once_without_tools():
+    path, tools = _fast_path("summarize")
+    model = StubModel()
+    text, llm_request = _turn(path, model, MESSAGE)
+    assert text == model.text
+    assert model.requests == [llm_request]
+    assert llm_request.config.tools is None
+    assert len(llm_request.contents) == 1
+    assert "Print function found" in llm_request.contents[0].parts[-1].text
+
+
+def test_other_messages_reach_the_model_unchanged():
+    path, tools = _fast_path("summarize")
+    model = StubModel()
+    _turn(path, model, "What is a generator?")
+    assert tools.calls == []
+    assert len(model.requests) == 1
+
+
+def test_summary_is_cached_after_the_model_answers():
+    path, tools = _fast_path("summarize")
+    model = StubModel()
+    _turn(path, model, MESSAGE)
+    text, _ = _turn(path, model, MESSAGE.replace("find the bugs", "Find  the BUGS"))
+    assert text == model.text
+    assert len(model.requests) == 1
+    assert tools.calls.count("analyze") == 1
+
+
+def test_cached_answers_expire():
+    now = [0.0]
+    path, tools = _fast_path("summarize", TTLCache(8, ttl=10, clock=lambda: now[0]))
+    model = StubModel()
+    _turn(path, model, MESSAGE)
+    now[0] = 9.0
+    _turn(path, model, MESSAGE)
+    assert len(model.requests) == 1
+    now[0] = 11.0
+    _turn(path, model, MESSAGE)
+    assert len(model.requests) == 2
+    assert tools.calls.count("analyze") == 2
@@ -0,0 +1,17 @@
+"""Tests for applying fixes in bug_finder/patch.py."""
+
+import pytest
+
+from bug_finder import patch
+
+
+@pytest.mark.parametrize("suggested_fix", ["", "   ", "\n", "\r\n\n"])
+def test_blank_fix_of_last_line_without_ending_deletes_it(suggested_fix):
+    result = patch.apply("x = 1\nprint(x)", [{"line": 2, "suggested_fix": suggested_fix}])
+    assert result.code == "x = 1\n"
+    assert result.applied == (0,)
+
+
+def test_fix_of_last_line_without_ending_keeps_it_unterminated():
+    result = patch.apply("x = 1\nprint(x)", [{"line": 2, "suggested_fix": "print(x + 1)\n"}])
+    assert result.code == "x = 1\nprint(x + 1)"
@@ -0,0 +1,21 @@
+"""Tests for the stage scheduler in workflows/pipeline.py."""
+
+from workflows.pipeline import Guard, Pipeline, Stage
+
+
+def test_speculative_stage_finishing_with_failed_guard_is_skipped():
+    allowed = {"run": True}
+    pipeline = Pipeline([
+        Stage("check", lambda code: len(code), inputs=("code",)),
+        Stage(
+            "execute", lambda code: "executed", inputs=("code",),
+            guards=(Guard("check", lambda size: allowed["run"]),), skipped="skipped", speculative=True
+        ),
+    ], inputs=("code",))
+    assert pipeline.run({"code": "x = 1"}).values["execute"] == "executed"
+
+    # Both outputs are cached now, so both stages finish in the same batch
+    allowed["run"] = False
+    run = pipeline.run({"code": "x = 1"})
+    assert run.values["execute"] == "skipped"
+    assert run.timings["execute"].status == "cancelled"
@@ -1,79 +1,219 @@
 """Bug finding workflow that coordinates multiple specialized agents."""
 
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List
 from google.adk.agents import workflow
+from bug_finder import cost, monitoring, verify
+from bug_finder.findings import FindingTable
 from bug_finder.agents.code_analyzer import analyzer_agent
 from bug_finder.agents.security_analyzer import security_agent
 from bug_finder.agents.fix_suggester import fix_agent
 from bug_finder.agents.code_executor import executor_agent
+from workflows import pipeline
 
-@workflow
-def bug_finding_workflow(code: str) -> Dict[str, Any]:
-    """Analyze code for bugs using multiple specialized agents.
-    
-    Args:
-        code: The code to analyze
-        
-    Returns:
-        Dict containing combined analysis results and suggested fixes
-    """
-    # Step 1: Static Analysis
-    structure_analysis = analyzer_agent.run({
-        "code": code
-    })
-    
-    # Step 2: Security Analysis
-    security_analysis = security_agent.run({
-        "code": code
-    })
-    
-    # Combine static analysis issues
-    all_issues = []
-    
-    # Add structure issues
+# Seconds a stage of the async workflow may take before it is given up
+STAGE_TIMEOUT = 30.0
+
+# Time limit passed to the code executor
+EXECUTION_TIMEOUT = 5
+
+def _structure_issues(structure_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
     if structure_analysis.get("status") == "success":
         result = structure_analysis.get("result", {})
         if result.get("syntax_valid"):
-            all_issues.extend(result.get("issues_found", []))
-    
-    # Add security issues
+            return result.get("issues_found", [])
+    return []
+
+def _security_issues(security_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
     if security_analysis.get("status") == "success":
-        all_issues.extend(security_analysis.get("issues", []))
-    
-    # Step 3: Get Fix Suggestions
-    fixes = fix_agent.run({
+        return security_analysis.get("issues", [])
+    return []
+
+def _ran(execution_result: Dict[str, Any]) -> bool:
+    # Code that failed when run still ran, and has runtime issues
+    return execution_result.get("status") in ("success", "error")
+
+def _runtime_issues(execution_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if _ran(execution_result):
+        return execution_result.get("result", {}).get("runtime_issues", [])
+    return []
+
+def _execution_request(code: str, admission: cost.Admission) -> Dict[str, Any]:
+    return {
         "code": code,
-        "issues": all_issues
-    })
-    
-    # Step 4: Safe Code Execution (only if no critical issues)
-    execution_result = {"status": "skipped"}
-    if not any(issue.get("severity") == "high" for issue in all_issues):
-        execution_result = executor_agent.run({
-            "code": code,
-            "timeout_seconds": 5
-        })
-        
-        # Add any runtime issues to the overall issues list
-        if execution_result.get("status") == "success":
-            runtime_issues = execution_result.get("result", {}).get("runtime_issues", [])
-            all_issues.extend(runtime_issues)
-    
-    # Combine all results
+        "timeout_seconds": admission.timeout,
+        "priority": admission.priority,
+        # Coverage and swallowed exceptions, where they come almost for free
+        "monitor": monitoring.LOW_OVERHEAD
+    }
+
+def _refused(admission: cost.Admission) -> Dict[str, Any]:
+    return {"status": "skipped", "reason": admission.reason}
+
+def _verify_fixes(code: str, fixes: List[Dict[str, Any]], execution: Dict[str, Any]) -> Dict[str, Any]:
+    """Verifies the suggested fixes, re-running them only if the code itself ran."""
+    result = verify.verify(code, fixes, execute=_ran(execution))
+    return {
+        "status": "success",
+        "verdicts": [verdict._asdict() for verdict in result.verdicts],
+        "seconds": result.seconds
+    }
+
+def _accepted(fixes: List[Dict[str, Any]], verification: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if verification.get("status") != "success":
+        return fixes
+    return [fixes[verdict["index"]] for verdict in verification["verdicts"] if verdict["status"] == "accepted"]
+
+def _has_issues(issues: Callable[[Dict[str, Any]], List[Dict[str, Any]]]) -> Callable[[Dict[str, Any]], bool]:
+    return lambda analysis: bool(issues(analysis))
+
+def _no_high_severity(issues: Callable[[Dict[str, Any]], List[Dict[str, Any]]]) -> Callable[[Dict[str, Any]], bool]:
+    return lambda analysis: not any(issue.get("severity") == "high" for issue in issues(analysis))
+
+def _execute(code: str, estimate: cost.CostEstimate) -> Dict[str, Any]:
+    # Only code expected to finish runs; expensive code gets a shorter timeout
+    admission = cost.admit(estimate, EXECUTION_TIMEOUT)
+    if not admission.run:
+        return _refused(admission)
+    return executor_agent.run(_execution_request(code, admission))
+
+def _speculate(code: str, estimate: cost.CostEstimate) -> bool:
+    # Cheap runs start alongside the analyses and are dropped if one of
+    # them finds a high-severity issue
+    return estimate.cost_class in ("cheap", "moderate")
+
+_NO_FIXES = {"status": "success", "fixes": []}
+
+# Produced by stages that time out, in the shape their readers expect
+_UNESTIMATED = cost.CostEstimate(
+    "expensive", float(cost.EXPENSIVE_OPERATIONS), 0, ((1, "could not be estimated in time"),)
+)
+
+def _timed_out(analysis: str) -> Dict[str, Any]:
+    return {"status": "error", "error": f"The {analysis} timed out"}
+
+# Agent calls mostly wait on the model, so they run in the larger pool
+_AGENT_POOL = "sandbox"
+
+PIPELINE = pipeline.Pipeline([
+    # Code that cannot be estimated in time still runs, with the shorter timeout
+    pipeline.Stage("estimate", cost.estimate, inputs=("code",), skipped=_UNESTIMATED),
+    pipeline.Stage(
+        "structure", lambda code: analyzer_agent.run({"code": code}),
+        inputs=("code",), skipped=_timed_out("structure analysis"), pool=_AGENT_POOL
+    ),
+    pipeline.Stage(
+        "security", lambda code: security_agent.run({"code": code}),
+        inputs=("code",), skipped=_timed_out("security analysis"), pool=_AGENT_POOL
+    ),
+    # Fixes for each analysis are requested as soon as it finishes
+    pipeline.Stage(
+        "structure_fixes",
+        lambda code, structure: fix_agent.run({"code": code, "issues": _structure_issues(structure)}),
+        inputs=("code", "structure"),
+        guards=(pipeline.Guard("structure", _has_issues(_structure_issues)),),
+        skipped=_NO_FIXES,
+        pool=_AGENT_POOL
+    ),
+    pipeline.Stage(
+        "security_fixes",
+        lambda code, security: fix_agent.run({"code": code, "issues": _security_issues(security)}),
+        inputs=("code", "security"),
+        guards=(pipeline.Guard("security", _has_issues(_security_issues)),),
+        skipped=_NO_FIXES,
+        pool=_AGENT_POOL
+    ),
+    pipeline.Stage(
+        "execution", _execute,
+        inputs=("code", "estimate"),
+        guards=(
+            pipeline.Guard("structure", _no_high_severity(_structure_issues)),
+            pipeline.Guard("security", _no_high_severity(_security_issues)),
+        ),
+        skipped={"status": "skipped"},
+        speculative=_speculate,
+        # Runs code; the sandbox caches deterministic runs itself
+        cache=False,
+        pool=_AGENT_POOL
+    ),
+    pipeline.Stage(
+        "fixes",
+        lambda structure_fixes, security_fixes: structure_fixes.get("fixes", []) + security_fixes.get("fixes", []),
+        inputs=("structure_fixes", "security_fixes"),
+        skipped=[],
+        cache=False
+    ),
+    pipeline.Stage(
+        "verification", _verify_fixes,
+        inputs=("code", "fixes", "execution"),
+        skipped=_timed_out("fix verification"),
+        cache=False,
+        pool="sandbox"
+    ),
+], inputs=("code",))
+
+def _combine(run: pipeline.Run) -> Dict[str, Any]:
+    values = run.values
+    structure_analysis = values["structure"]
+    execution_result = values["execution"]
+    findings = FindingTable()
+    findings.extend_issues(_structure_issues(structure_analysis))
+    findings.extend_issues(_security_issues(values["security"]))
+    # Add any runtime issues, or why the code was not run
+    findings.extend_issues(_runtime_issues(execution_result))
+    if execution_result.get("status") == "skipped" and "reason" in execution_result:
+        findings.extend_issues(cost.issues(values["estimate"]))
+    severity_counts = findings.severity_counts()
     return {
         "status": "success",
         "analysis": {
             "structure": structure_analysis,
-            "security": security_analysis,
-            "execution": execution_result
+            "security": values["security"],
+            "execution": execution_result,
+            "cost": values["estimate"]._asdict(),
+            "verification": values["verification"]
         },
-        "issues": all_issues,
-        "fixes": fixes.get("fixes", []),
+        "issues": findings.to_dicts(),
+        # Only fixes that compile and remove their finding
+        "fixes": _accepted(values["fixes"], values["verification"]),
         "metrics": structure_analysis.get("result", {}).get("metrics", {}),
         "summary": {
-            "total_issues": len(all_issues),
-            "high_severity": len([i for i in all_issues if i.get("severity") == "high"]),
-            "medium_severity": len([i for i in all_issues if i.get("severity") == "medium"]),
-            "low_severity": len([i for i in all_issues if i.get("severity") == "low"])
-        }
-    } 
\ No newline at end of file
+            "total_issues": len(findings),
+            "high_severity": severity_counts["high"],
+            "medium_severity": severity_counts["medium"],
+            "low_severity": severity_counts["low"]
+        },
+        "timings": run.timing_breakdown()
+    }
+
+@workflow
+def bug_finding_workflow(code: str) -> Dict[str, Any]:
+    """Analyze code for bugs using multiple specialized agents.
+    
+    The steps are the stages of ``PIPELINE``: the structure and security
+    analyses, fix suggestions for each, execution (only without
+    high-severity findings) and fix verification. Stages start as soon as
+    their inputs are ready, and stages whose inputs did not change since
+    an earlier run are served from the stage cache.
+    
+    Args:
+        code: The code to analyze
+        
+    Returns:
+        Dict containing combined analysis results, suggested fixes and
+        the timing of each stage
+    """
+    return _combine(PIPELINE.run({"code": code}))
+
+@workflow
+async def bug_finding_workflow_async(code: str, stage_timeout: float = STAGE_TIMEOUT) -> Dict[str, Any]:
+    """Async version of ``bug_finding_workflow`` with the same result.
+
+    Args:
+        code: The code to analyze
+        stage_timeout: Seconds each stage may take
+
+    Returns:
+        Dict containing combined analysis results, suggested fixes and
+        the timing of each stage
+    """
+    return _combine(await PIPELINE.run_async({"code": code}, stage_timeout))
@@ -0,0 +1,237 @@
+"""Declarative pipelines of stages, run as a DAG.
+
+A stage reads the named values listed in its ``inputs`` and produces the
+value named after it. The scheduler starts every stage as soon as its
+inputs are known, so independent stages run at the same time, and caches
+each stage's output by a hash of its inputs, so running a pipeline again
+only re-runs the stages whose inputs changed.
+
+Guards are conditional edges: a stage whose guard fails does not run and
+produces its ``skipped`` value instead, as does a stage that times out. A
+speculative stage starts before its guards can be decided and is cancelled
+if one of them fails; the stage's thread sees ``aio.cancelled()`` set,
+which kills its sandbox run.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from bug_finder import aio
+from bug_finder.cache import LRUCache, content_hash
+
+# Stage outputs kept in memory, per pipeline
+DEFAULT_STAGE_CACHE_SIZE = 128
+
+_MISSING = object()
+
+
+class Guard(NamedTuple):
+    """Edge from ``source`` that lets a stage run only if ``condition`` holds for it."""
+    source: str
+    condition: Callable[[Any], bool]
+
+
+class Stage(NamedTuple):
+    """A step of a pipeline, producing the value named ``name``."""
+    name: str
+    # Called with the input values as keyword arguments
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    guards: Tuple[Guard, ...] = ()
+    # Output of the stage when a guard fails or it times out; stages read
+    # by others should give one of the type they expect
+    skipped: Any = None
+    # Whether to start before the guards are decided; a callable decides
+    # from the inputs
+    speculative: Union[bool, Callable[..., bool]] = False
+    # Whether the output is a function of the inputs alone
+    cache: bool = True
+    # The ``aio`` pool the stage runs in: "analysis" for CPU-bound stages,
+    # "sandbox" for stages that mostly wait
+    pool: str = "analysis"
+
+
+class Timing(NamedTuple):
+    """How one stage of a run went."""
+    # "ran", "cached", "skipped", "cancelled" or "timeout"
+    status: str
+    # Seconds from the start of the run
+    started: float = 0.0
+    seconds: float = 0.0
+
+
+class Run(NamedTuple):
+    values: Dict[str, Any]
+    timings: Dict[str, Timing]
+    seconds: float
+
+    def timing_breakdown(self) -> Dict[str, Any]:
+        """Per-stage timings, in the order the stages started."""
+        stages = sorted(self.timings.items(), key=lambda item: item[1].started)
+        return {
+            "stages": {name: timing._asdict() for name, timing in stages},
+            "total_seconds": self.seconds
+        }
+
+
+def _sorted_stages(stages: Iterable[Stage], inputs: Tuple[str, ...]) -> List[Stage]:
+    """Orders ``stages`` so that every stage comes after those it reads from."""
+    pending = {}
+    for stage in stages:
+        if stage.name in pending or stage.name in inputs:
+            raise ValueError(f"Value {stage.name!r} is produced twice")
+        pending[stage.name] = stage
+    known = set(inputs)
+    ordered = []
+    while pending:
+        ready = [
+            stage for stage in pending.values()
+            if known.issuperset(stage.inputs) and known.issuperset(guard.source for guard in stage.guards)
+        ]
+        if not ready:
+            missing = {
+                name: sorted(set(stage.inputs).union(guard.source for guard in stage.guards) - known)
+                for name, stage in pending.items()
+            }
+            raise ValueError(f"Stages with unknown or cyclic inputs: {missing}")
+        for stage in ready:
+            ordered.append(pending.pop(stage.name))
+            known.add(stage.name)
+    return ordered
+
+
+def _cache_key(stage: Stage, inputs: Dict[str, Any]) -> str:
+    encoded = json.dumps([stage.name, inputs], sort_keys=True, default=repr)
+    return content_hash(encoded)
+
+
+class Pipeline:
+    """A DAG of stages over the named ``inputs`` given to ``run``."""
+
+    def __init__(self, stages: Iterable[Stage], inputs: Tuple[str, ...], cache_size: Optional[int] = None):
+        self.inputs = inputs
+        self.stages = _sorted_stages(stages, inputs)
+        if cache_size is None:
+            cache_size = int(os.getenv("BUG_FINDER_STAGE_CACHE_SIZE", DEFAULT_STAGE_CACHE_SIZE))
+        self.cache = LRUCache(cache_size)
+
+    async def _call(self, stage: Stage, inputs: Dict[str, Any], started: float, timeout: Optional[float]) -> Tuple[Any, Timing]:
+        offset = time.perf_counter() - started
+        key = _cache_key(stage, inputs) if stage.cache else None
+        if key is not None:
+            cached = self.cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                return cached, Timing("cached", offset)
+        try:
+            value = await asyncio.wait_for(aio.run_in_pool(stage.pool, stage.func, **inputs), timeout)
+        except asyncio.TimeoutError:
+            # The thread finishes in the background and its result is dropped
+            return stage.skipped, Timing("timeout", offset, time.perf_counter() - started - offset)
+        if key is not None:
+            self.cache.put(key, value)
+        return value, Timing("ran", offset, time.perf_counter() - started - offset)
+
+    async def run_async(self, values: Dict[str, Any], timeout: Optional[float] = None) -> Run:
+        """Runs the pipeline on ``values`` for its inputs.
+
+        Args:
+            values: A value for every name in ``inputs``
+            timeout: Seconds each stage may take before it is given up; a
+                stage that times out produces its ``skipped`` value
+
+        Returns:
+            Every input and stage value, and the timing of every stage
+        """
+        started = time.perf_counter()
+        values = {name: values[name] for name in self.inputs}
+        timings: Dict[str, Timing] = {}
+        waiting = list(self.stages)
+        running: Dict[asyncio.Future, Stage] = {}
+        # Speculative stages that finished before their guards were decided
+        held: Dict[str, Tuple[Stage, Any, Timing]] = {}
+
+        def guards_hold(stage: Stage) -> Optional[bool]:
+            """Whether the guards of ``stage`` hold, or None while one is undecided."""
+            decided = True
+            for guard in stage.guards:
+                if guard.source not in values:
+                    decided = False
+                elif not guard.condition(values[guard.source]):
+                    return False
+            return True if decided else None
+
+        def advance() -> None:
+            """Settles guards and starts every stage whose inputs are known."""
+            progress = True
+            while progress:
+                progress = False
+                for task, stage in list(running.items()):
+                    if guards_hold(stage) is False:
+                        task.cancel()
+                        del running[task]
+                        offset = timings[stage.name].started
+                        timings[stage.name] = Timing("cancelled", offset, time.perf_counter() - started - offset)
+                        values[stage.name] = stage.skipped
+                        progress = True
+                for stage, value, timing in list(held.values()):
+                    verdict = guards_hold(stage)
+                    if verdict is not None:
+                        del held[stage.name]
+                        timings[stage.name] = timing if verdict else timing._replace(status="cancelled")
+                        values[stage.name] = value if verdict else stage.skipped
+                        progress = True
+                for stage in list(waiting):
+                    verdict = guards_hold(stage)
+                    if verdict is False:
+                        waiting.remove(stage)
+                        timings[stage.name] = Timing("skipped", time.perf_counter() - started)
+                        values[stage.name] = stage.skipped
+                        progress = True
+                        continue
+                    if not all(name in values for name in stage.inputs):
+                        continue
+                    inputs = {name: values[name] for name in stage.inputs}
+                    speculative = stage.speculative(**inputs) if callable(stage.speculative) else stage.speculative
+                    if verdict is None and not speculative:
+                        continue
+                    waiting.remove(stage)
+                    timings[stage.name] = Timing("ran", time.perf_counter() - started)
+                    running[asyncio.ensure_future(self._call(stage, inputs, started, timeout))] = stage
+                    progress = True
+
+        try:
+            advance()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    value, timing = task.result()
+                    verdict = guards_hold(stage)
+                    if verdict is None:
+                        held[stage.name] = (stage, value, timing)
+                    elif verdict is False:
+                        # A guard failed in the same batch: discarded as if cancelled
+                        timings[stage.name] = timing._replace(status="cancelled")
+                        values[stage.name] = stage.skipped
+                    else:
+                        values[stage.name] = value
+                        timings[stage.name] = timing
+                advance()
+        finally:
+            for task in running:
+                task.cancel()
+        return Run(values, timings, time.perf_counter() - started)
+
+    def run(self, values: Dict[str, Any], timeout: Optional[float] = None) -> Run:
+        """Synchronous ``run_async``, for callers without an event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_async(values, timeout))
+        # Called from a coroutine: run on an event loop of its own
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.run_async(values, timeout)).result()